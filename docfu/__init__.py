@@ -2,21 +2,31 @@
 from __future__ import with_statement
 
 import glob
+import hashlib
+import json
 import logging
 import os.path
 import shutil
+import sys
+import traceback
 
-import jinja2
-import markdown
 from time import gmtime, strftime
 
-from ext import render_markdown, MarkdownJinja
+# jinja2, markdown, pygments and GitPython are imported where they are
+# used, so that `docfu -V` and `docfu -h` stay fast.
+from cache import RenderCache, DEFAULT_MAX_SIZE
+from files import is_selected, scan_files, ASSET, PAGE, TEMPLATE
+from memory import limits, peak_rss
+from metrics import BuildMetrics, record
+from log import async_handler, JSONFormatter, ThreadFilter
+from pages import build_page_index
+from sitemap import read_manifest, update_manifest, write_sitemap
 from util import (
     git_clone, git_checkout,
     list_doc_tree, list_refs,
     tmp_mk, tmp_close, tmp_cp,
     get_git_tag, get_git_branch,
-    parse_package_json, walk_files, uri_parse
+    parse_package_json, is_unchanged, merge_tree, uri_parse
 )
 
 __major__ = 0
@@ -39,6 +49,122 @@ docfu_figlet = """
 logger = logging.getLogger(__name__)
 
 
+class PageError(Exception):
+    """ A page could not be rendered. `failure` is a dict describing why:
+    ``page``, ``error``, ``message``, ``filename``, ``lineno``. """
+
+    def __init__(self, failure):
+        super(PageError, self).__init__(failure['message'])
+        self.failure = failure
+
+
+def _page_worker(docfu, conn):
+    """ Render the pages whose paths arrive on `conn` until None does, and
+    send back each result and the highlighting it did. Runs in a worker
+    process forked from the build's thread. """
+    from highlight import highlighter, using
+    from log import after_fork
+
+    after_fork()
+    highlighter.after_fork()
+    docfu.highlighter.after_fork()
+    with using(docfu.highlighter):
+        while True:
+            try:
+                path = conn.recv()
+            except EOFError:
+                break
+            if path is None:
+                break
+            try:
+                before = docfu.highlighter.snapshot()
+                html = docfu._render_template(path)
+                conn.send(('ok', (html, docfu.highlighter.report(before))))
+            except Exception:
+                conn.send(('error', docfu._failure(path, sys.exc_info())))
+    conn.close()
+
+
+class PageWorker(object):
+    """ A long-lived process rendering the pages of `docfu` one at a time,
+    so its template environment and highlighter stay warm between pages.
+    The process is started on first use, and killed and started again when
+    a page takes longer than `timeout` seconds. """
+
+    def __init__(self, docfu, timeout):
+        self.docfu = docfu
+        self.timeout = timeout
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        import multiprocessing
+
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_page_worker,
+            args=(self.docfu, child_conn))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+    def render(self, path):
+        """ Return ``(html, highlight report rows)`` for the page `path`.
+        Raises `PageError` if it fails, times out or kills the worker. """
+        if self.process is None:
+            self.start()
+        self.conn.send(path)
+        if not self.conn.poll(self.timeout):
+            self.kill()
+            raise PageError(self.docfu._failure(path, None,
+                "Timed out after %gs" % self.timeout))
+        try:
+            status, result = self.conn.recv()
+        except EOFError:
+            exitcode = self.kill()
+            raise PageError(self.docfu._failure(path, None,
+                "Worker exited with code %s" % exitcode))
+        if status == 'error':
+            raise PageError(result)
+        return result
+
+    def kill(self):
+        """ Stop the process at once and return its exit code. """
+        if self.process is None:
+            return None
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        exitcode = self.process.exitcode
+        self.process = self.conn = None
+        return exitcode
+
+    def stop(self):
+        """ Let the process finish and wait for it. """
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(self.timeout)
+        self.kill()
+
+
+def _library_versions():
+    """ Return the versions of the libraries rendering depends on. """
+    import jinja2
+    import markdown
+    try:
+        import pygments
+        pygments_version = pygments.__version__
+    except ImportError:
+        pygments_version = None
+    # Markdown 2.x has `version`; in 2.x `__version__` is a module
+    markdown_version = getattr(markdown, 'version', None) or \
+        markdown.__version__
+    return json.dumps([jinja2.__version__, markdown_version, pygments_version])
+
+
 class Docfu(object):
     """
     A class which converts Markdown files in one git directory to HTML files in
@@ -47,6 +173,8 @@ class Docfu(object):
 
     def __init__(self, uri, root, dest, **kwargs):
         """ Docfu initialzation. """
+        self.metrics = BuildMetrics()
+        self.history = kwargs.get('history')
         self.uri = uri_parse(uri)
         self.root = os.path.normpath(root)
         dest = os.path.abspath(os.path.expanduser(dest))
@@ -55,6 +183,27 @@ class Docfu(object):
         if 'template_globals' in kwargs:
             self.template_globals = kwargs['template_globals']
 
+        self.site_url = (kwargs.get('site_url') or '').rstrip('/')
+
+        self.render_cache = None
+        if kwargs.get('cache_dir'):
+            self.render_cache = RenderCache(
+                os.path.join(kwargs['cache_dir'], 'render'),
+                max_size=kwargs.get('cache_size') or DEFAULT_MAX_SIZE)
+        self._template_info = {}
+        self._global_digests = {}
+        self._library_versions = None
+        self.highlighter = None
+        self._worker = None
+
+        self.highlight_workers = int(kwargs.get('highlight_workers') or 0)
+
+        self.page_timeout = float(kwargs.get('page_timeout') or 0)
+        self.on_error = kwargs.get('on_error') or 'skip'
+
+        self.memory_budget = int(kwargs.get('memory_budget') or 0)
+        self.limits = limits(self.memory_budget) if self.memory_budget else {}
+
         self.base_template = 'base.html'
         if 'base_template' in kwargs:
             self.base_template = kwargs['base_template']
@@ -64,7 +213,9 @@ class Docfu(object):
             self.repository_dir = os.path.expanduser(self.uri)
             self.git_repo = False
         else:
-            self.repository_dir = git_clone(self.uri)
+            with self.metrics.phase('clone'):
+                self.repository_dir = git_clone(self.uri,
+                    mirror=kwargs.get('git_mirror'))
             self.git_repo = True
 
         source_src_dir = self.root
@@ -103,8 +254,9 @@ class Docfu(object):
             self.git_ref_val = os.path.basename(self.uri)
 
         if self.git_repo:
-            git_checkout(self.repository_dir, self.git_ref_type,
-                self.git_ref_val)
+            with self.metrics.phase('clone'):
+                git_checkout(self.repository_dir, self.git_ref_type,
+                    self.git_ref_val)
 
         if "/" in self.git_ref_val:
             self.git_ref_val = self.git_ref_val.replace("/", "_")
@@ -114,7 +266,12 @@ class Docfu(object):
         self.source_dest_dir = os.path.join(self.dest)
         self.assets_dest_dir = os.path.join(self.dest, '_static')
         self.build_directory = tmp_mk()
-        self._init_directories()
+        self.only = kwargs.get('only')
+        with self.metrics.phase('scan'):
+            self.files = scan_files(self.source_src_dir, self.assets_src_dir,
+                self.templates_src_dir)
+        with self.metrics.phase('assets'):
+            self._init_directories()
 
         self.template_globals = self._init_template_globals()
 
@@ -122,9 +279,12 @@ class Docfu(object):
         if kwargs.get('log_file'):
             self.log_file = kwargs['log_file']
 
-        logger.addHandler(logging.FileHandler(
-            filename=self.log_file,
-            mode='w'))
+        file_handler = logging.FileHandler(filename=self.log_file, mode='w')
+        if kwargs.get('log_format') == 'json':
+            file_handler.setFormatter(JSONFormatter())
+        self._log_handler = async_handler(file_handler)
+        self._log_handler.addFilter(ThreadFilter())
+        logger.addHandler(self._log_handler)
 
         logger.info("%s" % docfu_figlet)
         logger.info("%s" % strftime("%Y-%m-%d %H:%M:%S", gmtime()))
@@ -155,7 +315,6 @@ dest: %s """ % (self.uri, self.root, self.dest,
 
         logger.debug(self.template_globals)
 
-        self.source_files = walk_files(self.source_src_dir)
         self._env = self._init_template_engine()
 
     def __enter__(self):
@@ -165,6 +324,18 @@ dest: %s """ % (self.uri, self.root, self.dest,
         logger.info("Cleaning up ...")
         if self.git_repo:
             tmp_close(self.repository_dir)
+        self.metrics.finish()
+        if self.history:
+            try:
+                record(self.history, self.metrics, self.uri,
+                    self.git_ref_type, self.git_ref_val,
+                    status='failed' if type or getattr(self, 'failures', None)
+                        else 'ok')
+            except Exception, e:
+                logger.warning("Could not record build metrics in %s: %s"
+                    % (self.history, e))
+        logger.removeHandler(self._log_handler)
+        self._log_handler.close()
 
     def __call__(self):
         self.render()
@@ -186,9 +357,21 @@ dest: %s """ % (self.uri, self.root, self.dest,
             logger.debug("`os.makedirs(%s)`" % self.source_dest_dir)
             os.makedirs(self.source_dest_dir)
 
-        logger.debug("`shutil.copytree.(%s, %s)`" %
-                (self.assets_src_dir, os.path.join(self.build_directory, os.path.split(self.assets_src_dir)[1])))
-        shutil.copytree(self.assets_src_dir, os.path.join(self.build_directory, os.path.split(self.assets_src_dir)[1]))
+        assets_name = os.path.basename(os.path.normpath(self.assets_src_dir))
+        assets_build_dir = os.path.join(self.build_directory, assets_name)
+        logger.debug("Copying %d assets to %s" % (
+            len(self.files.of_kind(ASSET)), assets_build_dir))
+        for asset in self.files.of_kind(ASSET):
+            if self.only and is_unchanged(
+                    os.path.join(self.dest, assets_name, asset.relpath),
+                    asset.size, asset.mtime):
+                # partial build: merged into the previous output as is
+                continue
+            asset_dest = os.path.join(assets_build_dir, asset.relpath)
+            if not os.path.isdir(os.path.dirname(asset_dest)):
+                os.makedirs(os.path.dirname(asset_dest))
+            shutil.copy2(asset.path, asset_dest)
+            self.metrics.count('bytes_written', asset.size)
 
     def _init_template_globals(self):
         """ Return a dictionary of template globals to use in the
@@ -221,65 +404,326 @@ dest: %s """ % (self.uri, self.root, self.dest,
             return self.branch
         return ""
 
+    @property
+    def source_files(self):
+        """ Yield the path of every page to render. """
+        for f in self.files.of_kind(PAGE):
+            if not self.only or is_selected(f.relpath, self.only):
+                yield f.path
+
     def _init_template_engine(self, **options):
         """ Return a jinja2 Environment. """
+        import jinja2
+        from ext import FrontMatterLoader, MarkdownJinja
+
         defaults = {
             'extensions': [MarkdownJinja],
-            'loader': jinja2.FileSystemLoader([self.templates_src_dir, self.source_src_dir]),
+            'loader': FrontMatterLoader([self.templates_src_dir, self.source_src_dir]),
         }
+        if self.limits:
+            defaults['cache_size'] = self.limits['template_cache']
 
         defaults.update(options)
         env = jinja2.Environment(**defaults)
-        logger.info(env.list_templates())
+        logger.info([f.relpath for f in self.files.of_kind(TEMPLATE)])
         return env
 
     def render(self):
         """ Render the docs found in the repository's source-dir into the
         destination dir. """
+        from highlight import Highlighter, highlighter, using
+
         logger.info("Rendering documents @ %s" % self.dest)
 
-        self.source_files = sorted(self.source_files)
+        with self.metrics.phase('index'):
+            self.template_globals['PAGES'] = build_page_index(
+                self.source_src_dir, self.files.of_kind(PAGE),
+                url_root=self.template_globals['URL_ROOT'],
+                cache_path=os.path.join(self.dest_root, '.docfu',
+                    'pages-%s-%s.json' % (self.git_ref_type,
+                                          self.git_ref_val)))
+        if self.render_cache:
+            self._global_digests = self._hash_globals()
+            self._library_versions = _library_versions()
+        self.rendered_pages = []
+        self.failures = []
+        if self.limits:
+            # bounded by this build's budget; the shared highlighter is used
+            # by other builds in this process
+            self.highlighter = Highlighter(
+                min(highlighter.max_entries, self.limits['highlight_entries']))
+        else:
+            self.highlighter = highlighter
+        highlight_timings = self.highlighter.snapshot()
+        with using(self.highlighter):
+            if self.highlight_workers:
+                with self.metrics.phase('highlight'):
+                    self._prewarm_highlighter()
+            with self.metrics.phase('render'):
+                try:
+                    self._render_pages()
+                finally:
+                    if self._worker:
+                        self._worker.stop()
+                        self._worker = None
+        if self.only and not (self.rendered_pages or self.failures):
+            logger.warning("--only %s matched no pages; paths are relative to "
+                "%s" % (' '.join(self.only), self.source_src_dir))
+
+        self._report_failures()
+        with self.metrics.phase('publish'):
+            if self.only:
+                # partial build: keep the rest of the previous output
+                merge_tree(self.build_directory, self.dest)
+            else:
+                shutil.rmtree(self.dest)
+                shutil.copytree(self.build_directory, self.dest)
+            for x in glob.iglob(os.path.join(self.dest, '**/*')):
+                os.chmod(x, 0775)
+            os.chmod(self.dest, 0775)
+        with self.metrics.phase('sitemap'):
+            self._write_sitemaps()
+        if self.render_cache:
+            logger.info("Render cache: %d reused, %d rendered"
+                % (self.render_cache.hits, self.render_cache.misses))
+            self.render_cache.prune()
+        for lang, blocks, seconds, hits in \
+                self.highlighter.report(highlight_timings):
+            logger.info("Highlighted %s: %d blocks in %.3fs, %d reused"
+                % (lang, blocks, seconds, hits))
+        # the process's peak, so in a build plan it includes earlier builds
+        self.peak_memory = peak_rss()
+        if self.peak_memory:
+            logger.info("Process peak memory: %.1f MB"
+                % (self.peak_memory / 1048576.0))
+            if self.memory_budget and self.peak_memory > self.memory_budget:
+                logger.warning("Process peak memory exceeded the budget of "
+                    "%.1f MB" % (self.memory_budget / 1048576.0))
+        logger.info("Documents rendered @ %s" % self.dest)
+
+    def _render_pages(self):
+        """ Render every selected page into the build directory. """
         for source_path in self.source_files:
-            source_path_relative = source_path.replace(self.source_src_dir, "")
+            source_path_relative = os.path.relpath(source_path,
+                self.source_src_dir)
             if source_path_relative.endswith(".jmd") or source_path_relative.endswith(".html"):
                 #with open(source_path, 'r') as source_file:
                     #source_data = source_file.read().decode('utf-8',
                     #    'replace')
                 source_dest = os.path.join(self.build_directory,
-                    source_path.replace(self.source_src_dir, ""))
+                    source_path_relative)
                 source_name = os.path.basename(source_dest)
+                page = os.path.splitext(source_path_relative)[0] + '.html'
                 try:
                     self._render(source_name, source_path_relative, source_dest)
-                except jinja2.exceptions.TemplateSyntaxError, e:
-                    msg = '''
-                    Syntax error:   %s
-                    Message:        %s
-                    Lineno:         %s
-                    Name:           %s''' % (e.filename, e.message, e.lineno, e.name)
-                    logging.error("Syntax error: %s" % source_name)
-                    logging.error(msg)
-                except jinja2.exceptions.TemplateError, e:
-                    logging.error("Could not render: %s" % source_name)
-                    logging.error(e.message)
-
-        shutil.rmtree(self.dest)
-        shutil.copytree(self.build_directory, self.dest)
-        for x in glob.iglob(os.path.join(self.dest, '**/*')):
-            os.chmod(x, 0775)
-        os.chmod(self.dest, 0775)
-        logger.info("Documents rendered @ %s" % self.dest)
+                    self.rendered_pages.append(page)
+                except PageError, e:
+                    self._page_failed(page, e.failure)
+                except Exception:
+                    self._page_failed(page,
+                        self._failure(source_path_relative, sys.exc_info()))
+
+    def _prewarm_highlighter(self):
+        """ Highlight the fenced code blocks of every page which is not in
+        the render cache in `highlight_workers` processes before
+        rendering. """
+        def texts():
+            for source_path in self.source_files:
+                if source_path.endswith('.jmd') and \
+                        not self._is_cached(source_path):
+                    with open(source_path, 'rb') as source_file:
+                        yield source_file.read().decode('utf-8', 'replace')
+
+        self.highlighter.prewarm(texts(), self.highlight_workers,
+            batch_size=self.limits.get('in_flight'))
+
+    def _is_cached(self, source_path):
+        """ Return True if the page at `source_path` will come from the
+        render cache. """
+        if not self.render_cache:
+            return False
+        try:
+            key = self._render_key(os.path.relpath(source_path,
+                self.source_src_dir))
+        except Exception:
+            # reported when the page is rendered
+            return False
+        return key is not None and self.render_cache.has(key)
+
+    def _write_sitemaps(self):
+        """ Write this ref's sitemap.xml and update the cross-version page
+        map at `dest_root` from the pages just rendered. Sitemaps need
+        absolute URLs, so none is written without `site_url`. """
+        pages = set(self.rendered_pages)
+        if self.only:
+            ref = '%s/%s' % (self.git_ref_type, self.git_ref_val)
+            pages.update(read_manifest(self.dest_root).get(ref, []))
+        if self.site_url:
+            url_root = self.site_url + self.template_globals['URL_ROOT']
+            write_sitemap(os.path.join(self.dest, 'sitemap.xml'),
+                [url_root + '/' + page for page in sorted(pages)])
+        else:
+            logger.warning("Not writing sitemap.xml: no site URL set "
+                "(--site-url)")
+        update_manifest(self.dest_root, self.git_ref_type, self.git_ref_val,
+            pages)
 
     def _render(self, name, path, dest):
         """ Render a single file. """
-        logger.info("  > Rendering document: %s --> %s" % (name, dest))
-        template = self._env.get_template(path)
-        #md_html = render_markdown(content)
-        html = template.render(**self.template_globals)
+        logger.info("  > Rendering document: %s --> %s", name, dest)
+        key = self._render_key(path) if self.render_cache else None
+        html = self.render_cache.get(key) if key else None
+        if html is None:
+            if self.page_timeout:
+                html = self._render_in_worker(path)
+            else:
+                html = self._render_template(path)
+            if key:
+                self.render_cache.put(key, html)
+            self.metrics.count('pages_rendered')
+        else:
+            self.metrics.count('pages_reused')
         dest_dir = os.path.dirname(dest)
         if not os.path.exists(dest_dir):
             os.makedirs(dest_dir)
 
         # make extension .html
         dest = os.path.splitext(dest)[0] + '.html'
+        data = html.encode('utf-8')
         with open(dest, 'wb') as output:
-            output.write(html.encode('utf-8'))
+            output.write(data)
+        self.metrics.count('bytes_written', len(data))
+
+    def _page(self, path):
+        """ Return the `Page` of the source `path`, or None. """
+        return self.template_globals['PAGES'].get(
+            os.path.splitext(path)[0] + '.html')
+
+    def _render_template(self, path):
+        """ Return the rendered HTML of the page `path`. The page's own
+        metadata is available to its templates as ``PAGE``. """
+        template = self._env.get_template(path)
+        #md_html = render_markdown(content)
+        return template.render(PAGE=self._page(path), **self.template_globals)
+
+    def _render_in_worker(self, path):
+        """ Render the page `path` in the build's `PageWorker`, giving up
+        after `page_timeout` seconds. Raises `PageError` on failure. Code the
+        worker highlights is counted in the highlight report but only cached
+        in the worker. """
+        if self._worker is None:
+            self._worker = PageWorker(self, self.page_timeout)
+        html, highlight_timings = self._worker.render(path)
+        self.highlighter.merge(highlight_timings)
+        return html
+
+    def _failure(self, path, exc_info, message=None):
+        """ Return a dict describing why the page `path` failed, with the
+        template file and line the error came from when it is known. """
+        failure = {'page': path, 'error': 'Timeout', 'message': message,
+                   'filename': None, 'lineno': None}
+        if exc_info:
+            etype, e, tb = exc_info
+            failure['error'] = etype.__name__
+            failure['message'] = getattr(e, 'message', None) or str(e)
+            failure['filename'] = getattr(e, 'filename', None)
+            failure['lineno'] = getattr(e, 'lineno', None)
+            if failure['lineno'] is None:
+                # Jinja2 rewrites tracebacks to point at template lines.
+                for filename, lineno, func, text in traceback.extract_tb(tb):
+                    if filename.endswith(('.jmd', '.html')):
+                        failure['filename'], failure['lineno'] = \
+                            filename, lineno
+        if failure['filename']:
+            failure['filename'] = failure['filename'].replace(
+                self.repository_dir, '').lstrip('/')
+        return failure
+
+    def _page_failed(self, page, failure):
+        """ Record a failed page and, with ``on_error='keep'``, carry over
+        its output from the previous build. """
+        logger.error("Could not render %(page)s: %(error)s: %(message)s"
+            % failure, extra={'data': {'failure': failure}})
+        self.failures.append(failure)
+        self.metrics.count('pages_failed')
+        previous = os.path.join(self.dest, page)
+        if self.on_error == 'keep' and os.path.isfile(previous):
+            kept = os.path.join(self.build_directory, page)
+            if not os.path.isdir(os.path.dirname(kept)):
+                os.makedirs(os.path.dirname(kept))
+            shutil.copy2(previous, kept)
+            self.rendered_pages.append(page)
+            failure['kept'] = True
+            logger.warning("Keeping the previous output of %s" % page)
+
+    def _report_failures(self):
+        """ Log a summary of the pages which failed to render. """
+        if not self.failures:
+            return
+        logger.error("%d page(s) failed to render:" % len(self.failures))
+        for failure in self.failures:
+            location = failure['filename'] or failure['page']
+            if failure['lineno']:
+                location += ':%d' % failure['lineno']
+            logger.error("  %s (%s): %s: %s%s" % (failure['page'], location,
+                failure['error'], failure['message'],
+                ' [kept previous]' if failure.get('kept') else ''),
+                extra={'data': {'failure': failure}})
+
+    def _template_deps(self, name):
+        """ Return ``(source hash, referenced templates, undeclared
+        variables)`` for the template `name`. Referenced templates are None
+        if any are only known at render time. """
+        import jinja2.meta
+
+        if name not in self._template_info:
+            source = self._env.loader.get_source(self._env, name)[0]
+            ast = self._env.parse(source)
+            refs = list(jinja2.meta.find_referenced_templates(ast))
+            self._template_info[name] = (
+                hashlib.sha1(source.encode('utf-8')).hexdigest(),
+                None if None in refs else refs,
+                jinja2.meta.find_undeclared_variables(ast))
+        return self._template_info[name]
+
+    def _hash_globals(self):
+        """ Return ``{name: SHA-1}`` of every template global, computed once
+        per build so that keying a page does not serialize ``PAGES`` again.
+        Paths under `dest_root` are left out of ``ALL_GIT_REFS`` so keys are
+        the same on every machine. """
+        digests = {}
+        for name, value in self.template_globals.items():
+            if name == 'ALL_GIT_REFS':
+                value = dict((ref_type, sorted(ref['ref_val']
+                                               for ref in refs['refs']))
+                             for ref_type, refs in value.items())
+            digests[name] = hashlib.sha1(json.dumps(value, sort_keys=True,
+                default=lambda o: getattr(o, 'pages', repr(o)))).hexdigest()
+        return digests
+
+    def _render_key(self, path):
+        """ Return the render cache key for the page `path`: a hash of the
+        docfu, Jinja2, Markdown and Pygments versions, its source, every
+        template it extends, includes or imports, and the template globals
+        any of them use. None if it cannot be cached. """
+        seen = {}
+        names = set()
+        pending = [path]
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            digest, refs, variables = self._template_deps(name)
+            if refs is None:
+                return None
+            seen[name] = digest
+            names.update(variables)
+            pending.extend(refs)
+
+        used = dict((k, v) for k, v in self._global_digests.items()
+                    if k in names)
+        if 'PAGE' in names:
+            used['PAGE'] = json.dumps(self._page(path), sort_keys=True)
+        return RenderCache.key(__version__, self._library_versions,
+            json.dumps(sorted(seen.items())),
+            json.dumps(sorted(used.items())))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+""" A content-addressed cache of rendered pages.
+
+Entries are stored as ``<path>/<key[:2]>/<key[2:]>``, where the key is a
+SHA-1 of everything the output depends on, so a cache directory can be
+copied between machines and shared between refs. Reads refresh an
+entry's mtime; `prune` removes the least recently used entries once the
+cache is bigger than `max_size` bytes. """
+from __future__ import with_statement
+
+import hashlib
+import logging
+import os
+import os.path
+import tempfile
+
+logger = logging.getLogger('docfu')
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+
+class RenderCache(object):
+    """ Rendered HTML keyed by content hash. """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        """ Return a cache key for `parts` (strings). """
+        sha = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, unicode):
+                part = part.encode('utf-8')
+            sha.update(part)
+            sha.update('\0')
+        return sha.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, key):
+        """ Return the cached text for `key`, or None. """
+        entry = self._entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                data = f.read()
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return data.decode('utf-8')
+
+    def has(self, key):
+        """ Return True if `key` is cached, without counting a hit or a
+        miss. """
+        return os.path.isfile(self._entry(key))
+
+    def put(self, key, text):
+        """ Store `text` under `key`. """
+        entry = self._entry(key)
+        entry_dir = os.path.dirname(entry)
+        if not os.path.isdir(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                # another build created it first
+                pass
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        os.rename(tmp_path, entry)
+
+    def _entries(self):
+        """ Yield ``(mtime, size, path)`` for every entry. """
+        if not os.path.isdir(self.path):
+            return
+        for current, dirnames, files in os.walk(self.path):
+            for f in files:
+                path = os.path.join(current, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def stats(self):
+        """ Return a dict describing the cache on disk and this session's
+        hits and misses. """
+        entries = list(self._entries())
+        return {
+            'path': self.path,
+            'entries': len(entries),
+            'size': sum(size for mtime, size, path in entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def prune(self, max_size=None):
+        """ Remove least recently used entries until the cache is no larger
+        than `max_size` (default `self.max_size`) bytes. Returns the number
+        of entries removed. """
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries())
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for mtime, entry_size, path in entries:
+            if size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            removed += 1
+        if removed:
+            logger.debug("Pruned %d entries from render cache %s"
+                         % (removed, self.path))
+        return removed
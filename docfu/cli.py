@@ -4,6 +4,7 @@ from __future__ import with_statement
 
 import argparse
 import logging
+import os.path
 import sys
 
 from docfu import log
@@ -20,7 +21,8 @@ def parse_args(argv):
         description=docfu_figlet)
 
     argp.add_argument('-c', '--config',
-        help='An [optional] configuration file to read.')
+        help='An [optional] configuration file to read. If it has '
+             '[project:<name>] sections, build them all instead of `uri`.')
 
     argp.add_argument('-b', '--branch',
         help='A git branch to checkout.')
@@ -49,15 +51,62 @@ def parse_args(argv):
         help='Directory to look for Jinja2 templates in.')
 
     argp.add_argument('uri',
-        nargs=1,
+        nargs='?',
         help='A URI to a file path, git repository, or github repo.')
 
     argp.add_argument('destination',
-        nargs=1,
+        nargs='?',
         help='Destination for compiled source.')
 
+    argp.add_argument('--only',
+        action='append',
+        metavar='PATH',
+        help='Only render pages matching this path or glob (e.g. '
+             '"guides/**"), relative to the source dir, and merge them into '
+             'the existing destination. May be repeated.')
+
+    argp.add_argument('--cache-dir',
+        help='Directory to cache rendered pages in. Can be shared between '
+             'refs and copied between machines.')
+
+    argp.add_argument('--cache-size',
+        type=int,
+        help='Maximum size of the render cache in megabytes.')
+
+    argp.add_argument('--history',
+        help='SQLite file to record build metrics in (see `docfu metrics`).')
+
+    argp.add_argument('--highlight-workers',
+        type=int,
+        default=0,
+        help='Highlight code blocks in this many processes before rendering.')
+
+    argp.add_argument('--page-timeout',
+        type=float,
+        help='Render each page in a worker process and fail it after this '
+             'many seconds.')
+
+    argp.add_argument('--on-error',
+        choices=['skip', 'keep'],
+        default='skip',
+        help='What to publish for a page that fails: nothing (skip) or its '
+             'output from the previous build (keep).')
+
+    argp.add_argument('--memory-budget',
+        type=int,
+        help='Approximate memory budget in megabytes; bounds the template '
+             'and highlighting caches and code blocks in flight.')
+
+    argp.add_argument('--site-url',
+        help='Public URL of the destination, used in sitemap.xml.')
+
     argp.add_argument('-l', '--log-file', help='File to log to.')
 
+    argp.add_argument('--log-format',
+        choices=['text', 'json'],
+        default='text',
+        help='Format of log records (json writes one object per line).')
+
     argp.add_argument('-V', '--version', action='store_const', const=True,
         default=False, dest='version', help="Output verison")
 
@@ -86,19 +135,105 @@ def parse_args(argv):
          help='Run in production mode or not (send emails on error)')
 
     options = argp.parse_args(argv)
+    if options.cache_size:
+        options.cache_size *= 1024 * 1024
+    if options.memory_budget:
+        options.memory_budget *= 1024 * 1024
+    if not (options.version or options.config) and \
+            not (options.uri and options.destination):
+        argp.error('uri and destination are required without --config')
 
     return vars(options)
 
 
+def parse_cache_args(argv):
+    """ Parse command line arguments for `docfu cache`. """
+
+    argp = argparse.ArgumentParser(
+        prog="docfu cache",
+        description='Inspect or prune a render cache.')
+
+    argp.add_argument('command', choices=['stats', 'prune'])
+
+    argp.add_argument('cache_dir',
+        help='The --cache-dir used for builds.')
+
+    argp.add_argument('--max-size',
+        type=int,
+        help='The --cache-size used for builds, in megabytes; prune down to '
+             'it (default: 1024).')
+
+    return vars(argp.parse_args(argv))
+
+
+def cache(argv):
+    """ `docfu cache stats|prune <cache_dir>` """
+    from docfu.cache import RenderCache
+
+    options = parse_cache_args(argv)
+    kwargs = {}
+    if options['max_size'] is not None:
+        kwargs['max_size'] = options['max_size'] * 1024 * 1024
+    render_cache = RenderCache(os.path.join(options['cache_dir'], 'render'),
+        **kwargs)
+    if options['command'] == 'prune':
+        print("Removed %d entries" % render_cache.prune())
+    stats = render_cache.stats()
+    print("%(path)s: %(entries)d entries, %(size)d bytes "
+          "(max %(max_size)d)" % stats)
+    return 0
+
+
+def parse_metrics_args(argv):
+    """ Parse command line arguments for `docfu metrics`. """
+
+    argp = argparse.ArgumentParser(
+        prog="docfu metrics",
+        description='Print build metrics in the Prometheus text format, or '
+                    'serve them over HTTP.')
+
+    argp.add_argument('history',
+        help='The --history file builds were recorded in.')
+
+    argp.add_argument('--serve',
+        type=int,
+        metavar='PORT',
+        help='Serve the metrics at http://HOST:PORT/metrics.')
+
+    argp.add_argument('--host',
+        default='127.0.0.1',
+        help='Address to serve on (default: 127.0.0.1).')
+
+    return vars(argp.parse_args(argv))
+
+
+def metrics(argv):
+    """ `docfu metrics <history> [--serve PORT]` """
+    from docfu.metrics import prometheus_text, serve
+
+    options = parse_metrics_args(argv)
+    if options['serve']:
+        log.init(level=logging.INFO, development=True)
+        serve(options['history'], options['serve'], options['host'])
+    else:
+        sys.stdout.write(prometheus_text(options['history']))
+    return 0
+
+
 def main(argv=None):
     """ Main """
 
     if not argv:
         argv = sys.argv[1:]
 
+    if argv and argv[0] == 'cache':
+        return cache(argv[1:])
+    if argv and argv[0] == 'metrics':
+        return metrics(argv[1:])
+
     options = parse_args(argv)
-    uri = options.get('uri')[0]
-    dest = options.get('destination')[0]
+    uri = options.get('uri')
+    dest = options.get('destination')
     root = options.get('root_dir')
     del options['uri']
     del options['destination']
@@ -110,13 +245,45 @@ def main(argv=None):
         return 0
 
     logger = log.init(level=options.get('verbosity', logging.DEBUG),
-        development=options.get('dev', False))
-
-    with Docfu(uri, root, dest, **options) as df:
-        df()
+        development=options.get('dev', False),
+        structured=options.get('log_format') == 'json')
+
+    try:
+        if options.get('config'):
+            status = build_plan(options['config'], options)
+            if status is not None:
+                return status
+            if not (uri and dest):
+                logger.error("%s has no [project:<name>] sections; pass a uri "
+                    "and destination to build" % options['config'])
+                return 2
+        with Docfu(uri, root, dest, **options) as df:
+            df()
+    finally:
+        log.shutdown()
 
     return 0  # success
 
+
+def build_plan(config_path, options=None):
+    """ Build every project described in the config file at `config_path`.
+    ``--cache-dir``, ``--history`` and ``--log-format`` from `options`
+    apply to the whole plan. Returns 1 if any ref failed to build, or None
+    if the file describes no projects. """
+    from docfu.config import Config
+    from docfu.plan import BuildPlan
+
+    options = options or {}
+    config = Config(config_path)
+    config.read()
+    if not config.projects():
+        return None
+    failed = BuildPlan.from_config(config,
+        cache_dir=options.get('cache_dir'),
+        history=options.get('history'),
+        log_format=options.get('log_format'))()
+    return 1 if failed else 0
+
 if __name__ == '__main__':
     STATUS = main()
     sys.exit(STATUS)
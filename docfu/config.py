@@ -4,6 +4,29 @@ import ConfigParser
 
 
 class Config(object):
+    """ A docfu configuration file.
+
+    Global settings live in the ``[docfu]`` section. Each project to build
+    gets a ``[project:<name>]`` section, and is built into ``<dest>/<name>``
+    unless it sets its own ``dest``::
+
+        [docfu]
+        dest = ~/public_html/docs
+        workers = 4
+        cache_dir = ~/tmp/docfu-cache
+
+        [project:theme]
+        uri = feltnerm/docfu-theme
+        refs = branch:master
+        priority = 10
+
+        [project:docfu]
+        uri = feltnerm/docfu
+        refs = branch:master tag:0.3.4
+        depends = theme
+    """
+
+    project_prefix = 'project:'
 
     def __init__(self, config_path=""):
         self.cp = ConfigParser.ConfigParser()
@@ -13,6 +36,21 @@ class Config(object):
     def read(self):
         self.cp.read(self.config_path)
 
+    def get(self, name, section=None, default=None):
+        """ Return option `name` from `section` (default ``[docfu]``), or
+        `default` if it is not set. """
+        section = section or self.section_default
+        if self.cp.has_option(section, name):
+            return self.cp.get(section, name)
+        return default
+
+    def projects(self):
+        """ Return a list of ``(name, options)`` tuples, one per
+        ``[project:<name>]`` section, in file order. """
+        return [(section[len(self.project_prefix):], dict(self.cp.items(section)))
+                for section in self.cp.sections()
+                if section.startswith(self.project_prefix)]
+
     def __getattr__(self, name, section=''):
         if section:
             return self.cp.get(section, name)
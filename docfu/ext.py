@@ -3,18 +3,48 @@ import jinja2.ext
 
 import markdown as md
 
-markd = md.Markdown(extensions=[
+import highlight
+from pages import split_front_matter
+
+highlight.install()
+
+MARKDOWN_EXTENSIONS = [
     'attr_list', 'fenced_code', 'smart_strong', 'tables', 'codehilite',
-    'headerid', 'sane_lists', 'wikilinks'],
-    output_format='html5')
+    'headerid', 'sane_lists', 'wikilinks']
+
+
+def markdowner():
+    """ Return a new `markdown.Markdown` instance with docfu's extensions.
+    Instances are not thread-safe, so each Jinja2 environment gets one. """
+    return md.Markdown(extensions=MARKDOWN_EXTENSIONS, output_format='html5')
+
+_markd = None
 
-render_markdown = lambda text: markd.convert(text)
+
+def render_markdown(text):
+    """ Render `text` with a shared `markdowner()`, created on first use. """
+    global _markd
+    if _markd is None:
+        _markd = markdowner()
+    return _markd.convert(text)
 
 
 def markup(text, *args, **kwargs):
     return render_markdown(text)
 
 
+class FrontMatterLoader(jinja2.FileSystemLoader):
+    """ A `jinja2.FileSystemLoader` which strips the front matter from
+    ``.jmd`` templates. """
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super(FrontMatterLoader, self).get_source(
+            environment, template)
+        if filename.endswith('.jmd'):
+            source = split_front_matter(source)[1]
+        return source, filename, uptodate
+
+
 class MarkdownJinja(jinja2.ext.Extension):
     """ Add markdown support to Jinja2 templates.
 
@@ -38,8 +68,9 @@ class MarkdownJinja(jinja2.ext.Extension):
 
     def __init__(self, environment):
         super(MarkdownJinja, self).__init__(environment)
-        environment.extend(markdowner=markd)
-        environment.filters['markdown'] = markup
+        environment.extend(markdowner=markdowner())
+        environment.filters['markdown'] = \
+            lambda text, *args, **kwargs: environment.markdowner.convert(text)
 
     def parse(self, parser):
         lineno = parser.stream.next().lineno
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+""" Source discovery.
+
+`scan_files` walks the source, assets and templates directories once and
+returns a sorted `FileIndex` of pages, templates and assets, with the size
+and mtime of each. Files matching a pattern in the source directory's
+``.docfuignore`` are left out. Patterns are globs matched against the path
+relative to the source directory and against the file name; a trailing
+``/`` only matches directories::
+
+    # editor droppings
+    *.swp
+    drafts/
+    _static/psd/*
+"""
+import fnmatch
+import logging
+import os
+import os.path
+
+from pages import PAGE_EXTENSIONS
+
+logger = logging.getLogger('docfu')
+
+IGNORE_FILE = '.docfuignore'
+
+PAGE = 'page'
+TEMPLATE = 'template'
+ASSET = 'asset'
+
+
+def read_ignore_file(path):
+    """ Return the patterns in the ignore file at `path` (none if it does
+    not exist). """
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def is_ignored(relpath, patterns, is_dir=False):
+    """ Return True if `relpath` matches any of the ignore `patterns`. """
+    name = os.path.basename(relpath)
+    for pattern in patterns:
+        if pattern.endswith('/'):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip('/')
+        if fnmatch.fnmatch(relpath, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def is_selected(relpath, patterns):
+    """ Return True if the page `relpath` is picked by one of `patterns`:
+    globs (``guides/**``), directories (``guides/``) or files, matched
+    against the source path or the ``.html`` output path. """
+    output = os.path.splitext(relpath)[0] + '.html'
+    for pattern in patterns:
+        pattern = os.path.normpath(pattern)
+        if pattern == os.curdir:
+            return True
+        for path in (relpath, output):
+            if fnmatch.fnmatch(path, pattern) or \
+                    path.startswith(pattern + os.sep):
+                return True
+    return False
+
+
+class SourceFile(object):
+    """ A file found by `scan_files`. `relpath` is relative to the
+    directory of its kind: the source, templates or assets directory. """
+
+    __slots__ = ('path', 'relpath', 'kind', 'size', 'mtime')
+
+    def __init__(self, path, relpath, kind, size, mtime):
+        self.path = path
+        self.relpath = relpath
+        self.kind = kind
+        self.size = size
+        self.mtime = mtime
+
+    def __repr__(self):
+        return "<SourceFile %s %s>" % (self.kind, self.relpath)
+
+
+class FileIndex(object):
+    """ The files of a build, sorted by kind and relative path. """
+
+    def __init__(self, files):
+        self.files = sorted(files, key=lambda f: (f.kind, f.relpath))
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def of_kind(self, kind):
+        """ Return the files of `kind` (``page``, ``template`` or
+        ``asset``). """
+        return [f for f in self.files if f.kind == kind]
+
+
+def _inside(path, directory):
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def scan_files(source_dir, assets_dir=None, templates_dir=None, ignore=None):
+    """ Walk `source_dir`, `assets_dir` and `templates_dir` once and return
+    a `FileIndex`.
+
+    In the source directory only ``.jmd``/``.html`` files are pages, and
+    files and directories starting with ``_`` or ``.`` are skipped, except
+    for the assets and templates directories. `ignore` defaults to the
+    patterns in ``<source_dir>/.docfuignore``. """
+    source_dir = os.path.normpath(source_dir)
+    if ignore is None:
+        ignore = read_ignore_file(os.path.join(source_dir, IGNORE_FILE))
+    special = []
+    for directory, kind in ((assets_dir, ASSET), (templates_dir, TEMPLATE)):
+        if directory:
+            special.append((os.path.normpath(directory), kind))
+
+    roots = [source_dir] + [d for d, kind in special
+                            if not _inside(d, source_dir)]
+    files = []
+    for root in roots:
+        logger.debug("Scanning: %s" % root)
+        for current, dirnames, filenames in os.walk(root):
+            kind, kind_root = PAGE, source_dir
+            for directory, special_kind in special:
+                if _inside(current, directory):
+                    kind, kind_root = special_kind, directory
+
+            def keep(name, is_dir):
+                path = os.path.join(current, name)
+                if is_dir and any(_inside(d, path) for d, k in special):
+                    return True
+                if kind == PAGE and name[0] in '_.':
+                    return False
+                return not is_ignored(os.path.relpath(path, source_dir),
+                                      ignore, is_dir)
+
+            dirnames[:] = sorted(d for d in dirnames if keep(d, True))
+            if kind == PAGE and any(part[0] in '_.' for part in
+                    os.path.relpath(current, source_dir).split(os.sep)
+                    if part != os.curdir):
+                # only walked through on the way to a special dir
+                continue
+            for name in filenames:
+                if kind == PAGE and not name.endswith(PAGE_EXTENSIONS):
+                    continue
+                if not keep(name, False):
+                    continue
+                path = os.path.join(current, name)
+                st = os.stat(path)
+                files.append(SourceFile(path, os.path.relpath(path, kind_root),
+                                        kind, st.st_size, st.st_mtime))
+
+    index = FileIndex(files)
+    logger.debug("Found %d pages, %d templates, %d assets" % (
+        len(index.of_kind(PAGE)), len(index.of_kind(TEMPLATE)),
+        len(index.of_kind(ASSET))))
+    return index
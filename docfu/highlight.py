@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+""" Cached syntax highlighting for the ``codehilite`` Markdown extension.
+
+``codehilite`` looks up a Pygments lexer and builds a formatter for every
+code block. `Highlighter` keeps one lexer per language and one formatter
+per set of options, and memoizes highlighted output by (language, code
+hash, options). `install` makes ``codehilite`` and ``fenced_code`` use
+it. Blocks can also be highlighted ahead of rendering, in a pool of worker
+processes, with `Highlighter.prewarm`.
+
+``codehilite`` uses the shared `highlighter` unless another one is
+selected for the current thread with `using`, e.g. one bounded by a
+build's memory budget. """
+from __future__ import with_statement
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from markdown.extensions import codehilite, fenced_code
+
+try:
+    import pygments
+    from pygments.formatters import get_formatter_by_name
+    from pygments.lexers import get_lexer_by_name, guess_lexer
+except ImportError:
+    pygments = None
+
+logger = logging.getLogger('docfu')
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class Highlighter(object):
+    """ Pygments highlighting with cached lexers, formatters and output.
+    Safe to share between threads. """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lexers = {}
+        self._formatters = {}
+        self._output = OrderedDict()
+        self._lock = threading.Lock()
+        # {language: [blocks highlighted, seconds, cache hits]}
+        self.timings = {}
+
+    @staticmethod
+    def key(code, lang, guess_lang, options):
+        return (lang, guess_lang,
+                hashlib.sha1(code.encode('utf-8')).hexdigest(), options)
+
+    def lexer(self, lang):
+        """ Return the cached lexer for `lang`, or None if there is none. """
+        if lang not in self._lexers:
+            try:
+                self._lexers[lang] = get_lexer_by_name(lang) if lang else None
+            except ValueError:
+                self._lexers[lang] = None
+        return self._lexers[lang]
+
+    def formatter(self, options):
+        """ Return the cached HTML formatter for `options`, a tuple of
+        ``(linenums, css_class, style, noclasses, hl_lines)``. """
+        if options not in self._formatters:
+            linenums, css_class, style, noclasses, hl_lines = options
+            self._formatters[options] = get_formatter_by_name('html',
+                linenos=linenums, cssclass=css_class, style=style,
+                noclasses=noclasses, hl_lines=list(hl_lines))
+        return self._formatters[options]
+
+    def render(self, code, lang, guess_lang, options):
+        """ Highlight `code`, bypassing the output cache. Returns ``(html,
+        language, seconds)``. """
+        start = time.time()
+        lexer = self.lexer(lang)
+        if lexer is None:
+            try:
+                if guess_lang:
+                    lexer = guess_lexer(code)
+                else:
+                    lexer = self.lexer('text')
+            except ValueError:
+                lexer = self.lexer('text')
+        html = pygments.highlight(code, lexer, self.formatter(options))
+        return html, lang or lexer.name.lower(), time.time() - start
+
+    def cached(self, key):
+        """ Return the highlighted output for `key`, or None. """
+        with self._lock:
+            entry = self._output.pop(key, None)
+            if entry is None:
+                return None
+            self._output[key] = entry
+            html, lang = entry
+            self.timings.setdefault(lang, [0, 0.0, 0])[2] += 1
+        return html
+
+    def store(self, key, html, lang, seconds):
+        """ Remember `html` for `key` and record the time it took. """
+        with self._lock:
+            self._output[key] = (html, lang)
+            while len(self._output) > self.max_entries:
+                self._output.popitem(last=False)
+            timing = self.timings.setdefault(lang, [0, 0.0, 0])
+            timing[0] += 1
+            timing[1] += seconds
+
+    def highlight(self, code, lang=None, guess_lang=True, options=()):
+        key = self.key(code, lang, guess_lang, options)
+        html = self.cached(key)
+        if html is None:
+            html, name, seconds = self.render(code, lang, guess_lang, options)
+            self.store(key, html, name, seconds)
+        return html
+
+    def resize(self, max_entries):
+        """ Keep at most `max_entries` highlighted blocks, dropping the
+        least recently used. """
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._output) > self.max_entries:
+                self._output.popitem(last=False)
+
+    def prewarm(self, texts, processes=2, batch_size=None):
+        """ Highlight the fenced code blocks found in `texts` (any iterable,
+        read once) in a pool of `processes` worker processes, so that
+        rendering finds them cached. At most `batch_size` blocks are held
+        and sent to the workers at a time. """
+        if not pygments:
+            return 0
+
+        import multiprocessing
+        pool = None
+        count = 0
+        blocks = set()
+        try:
+            for text in texts:
+                for m in fenced_code.FencedBlockPreprocessor.FENCED_BLOCK_RE.finditer(text):
+                    blocks.add((m.group('code'), m.group('lang') or None,
+                        tuple(codehilite.parse_hl_lines(m.group('hl_lines')))))
+                    if batch_size and len(blocks) >= batch_size:
+                        pool = pool or multiprocessing.Pool(processes)
+                        count += self._prewarm_batch(pool, blocks)
+                        blocks = set()
+            if blocks:
+                pool = pool or multiprocessing.Pool(processes)
+                count += self._prewarm_batch(pool, blocks)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        if count:
+            logger.debug("Highlighted %d code blocks in %d processes"
+                % (count, processes))
+        return count
+
+    def _prewarm_batch(self, pool, blocks):
+        results = pool.map(_prewarm_block, sorted(blocks))
+        for key, (html, lang, seconds) in results:
+            self.store(key, html, lang, seconds)
+        return len(results)
+
+    def report(self, since=None):
+        """ Return a list of ``(language, blocks, seconds, hits)`` sorted by
+        time, optionally only counting what happened after the `snapshot`
+        `since`. """
+        since = since or {}
+        rows = []
+        with self._lock:
+            for lang, (count, seconds, hits) in self.timings.items():
+                before = since.get(lang, (0, 0.0, 0))
+                if count - before[0] or hits - before[2]:
+                    rows.append((lang, count - before[0],
+                                 seconds - before[1], hits - before[2]))
+        return sorted(rows, key=lambda row: -row[2])
+
+    def merge(self, rows):
+        """ Add the `report` rows of another highlighter, e.g. one in a
+        worker process, to the timings. """
+        with self._lock:
+            for lang, count, seconds, hits in rows:
+                timing = self.timings.setdefault(lang, [0, 0.0, 0])
+                timing[0] += count
+                timing[1] += seconds
+                timing[2] += hits
+
+    def after_fork(self):
+        """ Replace the lock, which another thread may have held when this
+        process was forked. """
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """ Return the current timings, for `report`. """
+        with self._lock:
+            return dict((lang, tuple(t)) for lang, t in self.timings.items())
+
+
+highlighter = Highlighter()
+
+_local = threading.local()
+
+
+def current():
+    """ Return the highlighter selected for this thread with `using`, or
+    the shared `highlighter`. """
+    return getattr(_local, 'highlighter', None) or highlighter
+
+
+@contextmanager
+def using(h):
+    """ Make ``codehilite`` use the highlighter `h` in this thread for the
+    duration of the `with` block. """
+    previous = getattr(_local, 'highlighter', None)
+    _local.highlighter = h
+    try:
+        yield h
+    finally:
+        _local.highlighter = previous
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+    """ `markdown.extensions.codehilite.CodeHilite` using `highlighter`. """
+
+    def _prepare(self):
+        self.src = self.src.strip('\n')
+        if self.lang is None:
+            self._parseHeader()
+
+    def _args(self):
+        return (self.src, self.lang, self.guess_lang,
+                (self.linenums, self.css_class, self.style, self.noclasses,
+                 tuple(self.hl_lines)))
+
+    def hilite(self):
+        if not (pygments and self.use_pygments):
+            return codehilite.CodeHilite.hilite(self)
+        self._prepare()
+        return current().highlight(*self._args())
+
+
+def _prewarm_block(block):
+    """ Highlight one fenced block in a worker process. """
+    code, lang, hl_lines = block
+    hilite = CachedCodeHilite(code, lang=lang, hl_lines=list(hl_lines))
+    hilite._prepare()
+    args = hilite._args()
+    return highlighter.key(*args), highlighter.render(*args)
+
+
+def install():
+    """ Make the ``codehilite`` and ``fenced_code`` extensions highlight
+    through `highlighter`. """
+    codehilite.CodeHilite = CachedCodeHilite
+    fenced_code.CodeHilite = CachedCodeHilite
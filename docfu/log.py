@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import copy
+import json
 import os
 import sys
+import threading
 import logging
+import Queue
 
 from logging import Formatter, getLogger, StreamHandler, DEBUG
-from logging.handlers import SMTPHandler
+from logging.handlers import BufferingHandler
 
 # colorful logging taken from:
 # https://github.com/getpelican/pelican/blob/0548b6/pelican/log.py
@@ -29,13 +33,28 @@ def ansi(color, text):
     return '\033[1;{0}m{1}{2}'.format(code, text, RESET_TERM)
 
 
+def _exc_text(formatter, record):
+    """ Return the formatted traceback of `record`, or None. Queued records
+    carry it in ``exc_text`` (see `QueueHandler.prepare`). """
+    if record.exc_info and not record.exc_text:
+        record.exc_text = formatter.formatException(record.exc_info)
+    return record.exc_text
+
+
+def _with_exc(formatter, record, text):
+    exc_text = _exc_text(formatter, record)
+    if exc_text:
+        return text + '\n' + exc_text
+    return text
+
+
 class EmailFormatter(Formatter):
     """
     Convert a `logging.LogRecord' object into an email.
     """
 
     def format(self, record):
-        return '''
+        return _with_exc(self, record, '''
         Message type:       %s
         Location:           %s:%d
         Module:             %s
@@ -45,7 +64,7 @@ class EmailFormatter(Formatter):
 
         %s
         ''' % (record.levelname, record.pathname, record.lineno, record.module,
-               record.funcName, record.message)
+               record.funcName, record.getMessage()))
 
 
 class ANSIFormatter(Formatter):
@@ -53,7 +72,7 @@ class ANSIFormatter(Formatter):
     escape sequences."""
 
     def format(self, record):
-        msg = record.getMessage()
+        msg = _with_exc(self, record, record.getMessage())
         if record.levelname == 'INFO':
             return ansi('cyan', '-> ') + msg
         elif record.levelname == 'WARNING':
@@ -74,36 +93,258 @@ class TextFormatter(Formatter):
     """
 
     def format(self, record):
+        msg = _with_exc(self, record, record.getMessage())
         if not record.levelname or record.levelname == 'INFO':
-            return record.getMessage()
+            return msg
         else:
-            return record.levelname + ': ' + record.getMessage()
+            return record.levelname + ': ' + msg
+
+
+class JSONFormatter(Formatter):
+    """
+    Convert a `logging.LogRecord' object into a single line of JSON.
+
+    Any mapping passed as ``extra={'data': {...}}`` is merged into the
+    record, so callers can attach structured fields to a message.
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'name': record.name,
+            'module': record.module,
+            'lineno': record.lineno,
+            'message': record.getMessage(),
+        }
+        if isinstance(getattr(record, 'data', None), dict):
+            data.update(record.data)
+        exc_text = _exc_text(self, record)
+        if exc_text:
+            data['exc'] = exc_text
+        return json.dumps(data, sort_keys=True)
+
+
+class ThreadFilter(logging.Filter):
+    """ Only pass records logged by the thread that created the filter.
+    Keeps concurrent builds from writing into each other's log files. """
 
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.thread = threading.current_thread().ident
 
-def init(level=None, logger=getLogger(), handler=StreamHandler(), development=True):
-    logging.basicConfig(level=level, datefmt='%m-%d %H:%M')
+    def filter(self, record):
+        return record.thread == self.thread
+
+
+class DigestSMTPHandler(BufferingHandler):
+    """
+    Collect records and send them as a single email when flushed.
+
+    Records are only sent on `flush()` (or `close()`), so a build produces
+    at most one alert no matter how many errors it logs. At most
+    `capacity` records are kept; the rest are counted and summarized.
+    """
+
+    def __init__(self, mailhost, fromaddr, toaddrs, subject, capacity=100):
+        BufferingHandler.__init__(self, capacity)
+        self.mailhost = mailhost
+        self.fromaddr = fromaddr
+        self.toaddrs = toaddrs
+        self.subject = subject
+        self.dropped = 0
+
+    def shouldFlush(self, record):
+        return False
+
+    def emit(self, record):
+        if len(self.buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self.buffer.append(record)
+
+    def flush(self):
+        import smtplib
+        from email.utils import formatdate
+
+        self.acquire()
+        try:
+            if not self.buffer:
+                return
+            body = '\n'.join(self.format(r) for r in self.buffer)
+            if self.dropped:
+                body += '\n\n... and %d more suppressed.' % self.dropped
+            count = len(self.buffer) + self.dropped
+            msg = 'From: %s\r\nTo: %s\r\nSubject: %s (%d)\r\nDate: %s\r\n\r\n%s' % (
+                self.fromaddr, ','.join(self.toaddrs), self.subject, count,
+                formatdate(), body)
+            try:
+                smtp = smtplib.SMTP(self.mailhost)
+                smtp.sendmail(self.fromaddr, self.toaddrs, msg)
+                smtp.quit()
+            except Exception:
+                self.handleError(self.buffer[0])
+            self.buffer = []
+            self.dropped = 0
+        finally:
+            self.release()
+
+
+class QueueHandler(logging.Handler):
+    """
+    Put records onto a queue to be emitted by a `QueueListener`.
+
+    Emitting is then just a `put`, so slow handlers (files, SMTP) never
+    block the thread doing the logging.
+    """
+
+    def __init__(self, queue, listener=None):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.listener = listener
+
+    def prepare(self, record):
+        """ Return a copy of `record` with args merged into the message and
+        the traceback, if any, formatted into ``exc_text``, safe to hand to
+        another thread. The record itself is left alone for the other
+        handlers it propagates to. """
+        record = copy.copy(record)
+        _exc_text(self.formatter or logging._defaultFormatter, record)
+        msg = record.getMessage()
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """ Stop the listener, draining any queued records, and close the
+        handlers it was writing to. """
+        if self.listener:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        logging.Handler.close(self)
+
+
+class QueueListener(object):
+    """ Emit records taken from a queue to `handlers` in a background
+    thread. """
+
+    _sentinel = None
+
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = t = threading.Thread(target=self._monitor)
+        t.setDaemon(True)
+        t.start()
+
+    def stop(self):
+        if self._thread:
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get(True)
+            if record is self._sentinel:
+                break
+            self.handle(record)
+
+
+_queue_handlers = []
+
+
+def async_handler(*handlers):
+    """ Return a `QueueHandler` whose records are written to `handlers` by
+    a background thread. """
+    queue = Queue.Queue(-1)
+    listener = QueueListener(queue, *handlers)
+    handler = QueueHandler(queue, listener)
+    listener.start()
+    _queue_handlers.append(handler)
+    return handler
+
+
+def shutdown():
+    """ Flush and close every handler created by `async_handler`. Sends the
+    production-mode error digest, if any. """
+    while _queue_handlers:
+        handler = _queue_handlers.pop()
+        for logger in [getLogger()] + list(logging.Logger.manager.loggerDict.values()):
+            if isinstance(logger, logging.Logger) and handler in logger.handlers:
+                logger.removeHandler(handler)
+        handler.close()
+
+
+def after_fork():
+    """ Make logging safe in a child process forked while other threads may
+    have held its locks. `async_handler` listeners do not survive a fork, so
+    their handlers are detached; the child's records are dropped. """
+    logging._lock = threading.RLock()
+    for ref in logging._handlerList:
+        handler = ref()
+        if handler is not None:
+            handler.createLock()
+    loggers = [getLogger()] + [l for l in
+        logging.Logger.manager.loggerDict.values()
+        if isinstance(l, logging.Logger)]
+    while _queue_handlers:
+        handler = _queue_handlers.pop()
+        for logger in loggers:
+            if handler in logger.handlers:
+                logger.removeHandler(handler)
+    getLogger().addHandler(logging.NullHandler())
+
+
+def init(level=None, logger=getLogger(), handler=StreamHandler(),
+         development=True, structured=False):
+    """ Configure the root logger. Output is written by a background thread
+    via `async_handler`; call `shutdown()` once the build is done. """
     logger = logging.getLogger()
 
-    if (os.isatty(sys.stdout.fileno())
+    if structured:
+        fmt = JSONFormatter()
+    elif (os.isatty(sys.stdout.fileno())
             and not sys.platform.startswith('win')):
         fmt = ANSIFormatter()
     else:
         fmt = TextFormatter()
     handler.setFormatter(fmt)
-    logger.addHandler(handler)
+    handlers = [handler]
 
     if level:
         logger.setLevel(level)
 
     if not development:
-        logger.info("Setting up email handler for production-mode.")
         fmt = EmailFormatter()
-        smtpHandler = SMTPHandler('127.0.0.1', 'docfu@docs.fineuploader.com',
-            ['alerts@fineuploader.com'], 'ALERT docfu error!')
+        smtpHandler = DigestSMTPHandler('127.0.0.1',
+            'docfu@docs.fineuploader.com', ['alerts@fineuploader.com'],
+            'ALERT docfu error!')
         smtpHandler.setFormatter(fmt)
         smtpHandler.setLevel(logging.ERROR)
-        logger.addHandler(smtpHandler)
+        handlers.append(smtpHandler)
 
+    logger.addHandler(async_handler(*handlers))
+    if not development:
+        logger.info("Set up email handler for production-mode.")
     return logger
 
 # test
@@ -115,3 +356,4 @@ if __name__ == '__main__':
     root_logger.warning('warning')
     root_logger.error('error')
     root_logger.critical('critical')
+    shutdown()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+""" Memory budgets.
+
+A budget (in bytes) is split between docfu's caches using rough per-entry
+size estimates. The numbers are deliberately conservative; they bound the
+number of entries, not the exact number of bytes. """
+import sys
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# rough sizes of one entry, in bytes
+TEMPLATE_SIZE = 100 * 1024
+HIGHLIGHT_SIZE = 4 * 1024
+
+# share of the budget for each cache
+TEMPLATE_SHARE = 0.25
+HIGHLIGHT_SHARE = 0.10
+IN_FLIGHT_SHARE = 0.05
+
+
+def limits(budget):
+    """ Return a dict of cache limits for a memory `budget` in bytes:
+
+    * ``template_cache``: compiled templates Jinja2 keeps.
+    * ``highlight_entries``: highlighted code blocks kept in memory.
+    * ``in_flight``: code blocks handed to highlight workers at once.
+    """
+    return {
+        'template_cache': max(10, int(budget * TEMPLATE_SHARE / TEMPLATE_SIZE)),
+        'highlight_entries': max(64,
+            int(budget * HIGHLIGHT_SHARE / HIGHLIGHT_SIZE)),
+        'in_flight': max(16, int(budget * IN_FLIGHT_SHARE / HIGHLIGHT_SIZE)),
+    }
+
+
+def peak_rss():
+    """ Return the peak resident set size of this process and its finished
+    children in bytes, or None if it cannot be measured. """
+    if resource is None:
+        return None
+    peak = 0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        peak = max(peak, resource.getrusage(who).ru_maxrss)
+    # kilobytes on Linux, bytes on OS X
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+""" Build metrics and build history.
+
+`BuildMetrics` times the phases of a build and counts what it did.
+`record` appends a build to a SQLite history file, `prometheus_text`
+summarizes the history in the Prometheus text exposition format, and
+`serve` exposes that over HTTP at ``/metrics``. """
+from __future__ import with_statement
+
+import json
+import logging
+import os.path
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('docfu')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    uri TEXT NOT NULL,
+    ref_type TEXT NOT NULL,
+    ref_val TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL NOT NULL,
+    phases TEXT NOT NULL,
+    pages_rendered INTEGER NOT NULL,
+    pages_reused INTEGER NOT NULL,
+    pages_failed INTEGER NOT NULL,
+    bytes_written INTEGER NOT NULL
+)
+"""
+
+COUNTERS = ('pages_rendered', 'pages_reused', 'pages_failed', 'bytes_written')
+
+
+class BuildMetrics(object):
+    """ Phase durations (seconds) and counters for one build. """
+
+    def __init__(self):
+        self.started = time.time()
+        self.duration = 0.0
+        self.phases = {}
+        self.counters = dict((name, 0) for name in COUNTERS)
+
+    @contextmanager
+    def phase(self, name):
+        """ Add the time spent in the `with` block to phase `name`. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + \
+                time.time() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.duration = time.time() - self.started
+
+
+def _connect(history_path):
+    # imported here so that `docfu -V` and `docfu -h` stay fast
+    import sqlite3
+
+    conn = sqlite3.connect(os.path.expanduser(history_path), timeout=30)
+    conn.execute(SCHEMA)
+    return conn
+
+
+def record(history_path, metrics, uri, ref_type, ref_val, status='ok'):
+    """ Append the build described by `metrics` to the history file. """
+    conn = _connect(history_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO builds (started, uri, ref_type, ref_val, status, "
+                "duration, phases, pages_rendered, pages_reused, pages_failed, "
+                "bytes_written) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (metrics.started, uri, ref_type, ref_val, status,
+                 metrics.duration, json.dumps(metrics.phases))
+                + tuple(metrics.counters[name] for name in COUNTERS))
+    finally:
+        conn.close()
+    logger.debug("Recorded build metrics in %s" % history_path)
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (k, unicode(v).replace('\\', '\\\\')
+                                         .replace('"', '\\"'))
+                             for k, v in sorted(labels.items()))
+
+
+def _value(value):
+    # repr keeps every digit of a float; str rounds to 12
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(history_path):
+    """ Return the history in the Prometheus text format: totals over all
+    builds, and the metrics of the latest build of every uri and ref. """
+    conn = _connect(history_path)
+    try:
+        totals = conn.execute(
+            "SELECT uri, ref_type, ref_val, status, COUNT(*) FROM builds "
+            "GROUP BY uri, ref_type, ref_val, status").fetchall()
+        latest = conn.execute(
+            "SELECT uri, ref_type, ref_val, status, started, duration, "
+            "phases, pages_rendered, pages_reused, pages_failed, "
+            "bytes_written FROM builds WHERE id IN "
+            "(SELECT MAX(id) FROM builds GROUP BY uri, ref_type, ref_val)"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    lines = ['# HELP docfu_builds_total Builds recorded in the history.',
+             '# TYPE docfu_builds_total counter']
+    for uri, ref_type, ref_val, status, count in totals:
+        lines.append('docfu_builds_total%s %d' % (_labels(uri=uri,
+            ref='%s/%s' % (ref_type, ref_val), status=status), count))
+
+    gauges = [
+        ('last_build_timestamp_seconds', 'Start of the latest build.', 4),
+        ('last_build_duration_seconds', 'Duration of the latest build.', 5),
+        ('last_build_pages_rendered', 'Pages rendered by the latest build.', 7),
+        ('last_build_pages_reused', 'Pages reused from the render cache.', 8),
+        ('last_build_pages_failed', 'Pages which failed to render.', 9),
+        ('last_build_bytes_written', 'Bytes written by the latest build.', 10),
+    ]
+    for name, description, column in gauges:
+        lines.append("# HELP docfu_%s %s" % (name, description))
+        lines.append('# TYPE docfu_%s gauge' % name)
+        for row in latest:
+            lines.append('docfu_%s%s %s' % (name, _labels(uri=row[0],
+                ref='%s/%s' % (row[1], row[2])), _value(row[column])))
+
+    lines.append('# HELP docfu_last_build_phase_seconds Time spent in each '
+                 'phase of the latest build.')
+    lines.append('# TYPE docfu_last_build_phase_seconds gauge')
+    for row in latest:
+        for phase, seconds in sorted(json.loads(row[6]).items()):
+            lines.append('docfu_last_build_phase_seconds%s %s' % (
+                _labels(uri=row[0], ref='%s/%s' % (row[1], row[2]),
+                        phase=phase), _value(seconds)))
+    return '\n'.join(lines) + '\n'
+
+
+def serve(history_path, port=9129, host='127.0.0.1'):
+    """ Serve `prometheus_text` at ``http://<host>:<port>/metrics`` until
+    interrupted. """
+    import BaseHTTPServer
+
+    class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text(history_path).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = BaseHTTPServer.HTTPServer((host, port), MetricsHandler)
+    logger.info("Serving metrics at http://%s:%d/metrics" % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+""" Page metadata and the site-wide page index.
+
+A ``.jmd`` file may start with a front matter block of ``key: value``
+lines::
+
+    ---
+    title: Getting started
+    order: 1
+    tags: intro, guides
+    ---
+
+The block is stripped before the page is rendered (see
+`docfu.ext.FrontMatterLoader`) and its values are collected into a
+`PageIndex` which templates see as ``PAGES``; the page being rendered is
+``PAGE``. """
+from __future__ import with_statement
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+logger = logging.getLogger('docfu')
+
+FRONT_MATTER_DELIMITER = '---'
+PAGE_EXTENSIONS = ('.jmd', '.html')
+
+
+def split_front_matter(text):
+    """ Return ``(meta, body)`` for `text`. Front matter lines are replaced
+    with blank lines in `body` so template line numbers stay correct. """
+    lines = text.split('\n')
+    if not lines or lines[0].strip() != FRONT_MATTER_DELIMITER:
+        return {}, text
+    meta = {}
+    for end, line in enumerate(lines[1:], 1):
+        if line.strip() == FRONT_MATTER_DELIMITER:
+            break
+        if ':' in line:
+            key, value = line.split(':', 1)
+            meta[key.strip().lower()] = value.strip()
+    else:
+        # No closing delimiter; not front matter.
+        return {}, text
+
+    if 'order' in meta:
+        try:
+            meta['order'] = int(meta['order'])
+        except ValueError:
+            logger.warning("Ignoring non-integer order: %s" % meta['order'])
+            del meta['order']
+    if 'tags' in meta:
+        meta['tags'] = [t.strip() for t in meta['tags'].split(',')
+                        if t.strip()]
+    return meta, '\n' * (end + 1) + '\n'.join(lines[end + 1:])
+
+
+class Page(dict):
+    """ Metadata for one page. Keys are available as attributes in
+    templates: ``title``, ``order``, ``tags``, ``path`` (the output path,
+    relative to the ref), ``url``, ``source`` and any other front matter
+    keys. """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class PageIndex(object):
+    """ Every page of a build, sorted by ``order`` then ``path``. """
+
+    def __init__(self, pages):
+        self.pages = sorted(pages, key=lambda p: (p['order'], p['path']))
+        self._by_path = dict((p['path'], p) for p in self.pages)
+        self._by_tag = {}
+        for page in self.pages:
+            for tag in page['tags']:
+                self._by_tag.setdefault(tag, []).append(page)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def get(self, path, default=None):
+        """ Return the page whose output path is `path`. """
+        return self._by_path.get(path.lstrip('/'), default)
+
+    def tags(self):
+        """ Return a sorted list of every tag. """
+        return sorted(self._by_tag)
+
+    def tagged(self, tag):
+        """ Return the pages tagged `tag`. """
+        return list(self._by_tag.get(tag, []))
+
+    def under(self, prefix):
+        """ Return the pages whose output path starts with `prefix`, e.g.
+        ``PAGES.under('guides/')`` for a section's table of contents. """
+        prefix = prefix.lstrip('/')
+        return [p for p in self.pages if p['path'].startswith(prefix)]
+
+
+def build_page_index(source_dir, source_files, url_root='', cache_path=None):
+    """ Read the front matter of every page in `source_files` once and return
+    a `PageIndex`. `source_files` are `docfu.files.SourceFile` objects.
+
+    Parsed metadata is cached in the JSON file `cache_path`, keyed by the
+    SHA-1 of each file. Files whose size and mtime have not changed since
+    the cache was written are not read at all. """
+    cache = {'digests': {}, 'stats': {}}
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'r') as cache_file:
+                cache.update(json.load(cache_file))
+        except ValueError:
+            logger.warning("Ignoring corrupt page index cache: %s" % cache_path)
+
+    digests, stats = {}, {}
+    pages = []
+    for source_file in source_files:
+        source_path = source_file.path
+        if not source_path.endswith(PAGE_EXTENSIONS):
+            continue
+        source = os.path.relpath(source_path, source_dir)
+        stat = cache['stats'].get(source)
+        if stat and stat[:2] == [source_file.size, source_file.mtime] \
+                and stat[2] in cache['digests']:
+            digest = stat[2]
+            meta = cache['digests'][digest]
+        else:
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).hexdigest()
+            if digest in cache['digests']:
+                meta = cache['digests'][digest]
+            elif source_path.endswith('.jmd'):
+                meta = split_front_matter(data.decode('utf-8', 'replace'))[0]
+            else:
+                meta = {}
+        digests[digest] = meta
+        stats[source] = [source_file.size, source_file.mtime, digest]
+
+        path = os.path.splitext(source)[0] + '.html'
+        page = Page(meta)
+        page.setdefault('title', os.path.splitext(os.path.basename(source))[0])
+        page.setdefault('order', 0)
+        page.setdefault('tags', [])
+        page.update({
+            'source': source,
+            'path': path,
+            'url': url_root + '/' + path,
+        })
+        pages.append(page)
+
+    if cache_path:
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError, e:
+                # another build sharing the destination created it first
+                if e.errno != errno.EEXIST:
+                    raise
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as cache_file:
+            json.dump({'digests': digests, 'stats': stats}, cache_file)
+        os.rename(tmp_path, cache_path)
+
+    logger.debug("Indexed %d pages (%d cached)" % (
+        len(pages), len(set(digests) & set(cache['digests']))))
+    return PageIndex(pages)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+""" Build many projects, and many refs of each, from one configuration file.
+
+Every (project, ref) pair is a job. Jobs run on a shared pool of worker
+threads; a project's jobs wait for every job of the projects it `depends`
+on, and among ready jobs the highest `priority` runs first. Git
+repositories are mirrored once into a shared cache and every ref is cloned
+from that mirror; rendered pages are cached there too. """
+from __future__ import with_statement
+
+import heapq
+import logging
+import os.path
+import threading
+import Queue
+
+from docfu import Docfu
+from util import git_mirror, uri_parse
+
+logger = logging.getLogger(__name__)
+
+PROJECT_OPTIONS = ('root_dir', 'source_dir', 'assets_dir', 'templates_dir',
+                   'base_template', 'log_format', 'site_url',
+                   'highlight_workers', 'memory_budget', 'page_timeout',
+                   'on_error')
+
+
+def parse_refs(refs):
+    """ Parse a string like ``"branch:master tag:0.3.4 develop"`` into a list
+    of ``(ref_type, ref_val)`` tuples. Untyped refs are branches. """
+    result = []
+    for ref in refs.replace(',', ' ').split():
+        if ':' in ref:
+            ref_type, ref_val = ref.split(':', 1)
+        else:
+            ref_type, ref_val = 'branch', ref
+        if ref_type not in ('branch', 'tag'):
+            raise ValueError("Unknown ref type %r in %r" % (ref_type, ref))
+        result.append((ref_type, ref_val))
+    return result
+
+
+class Project(object):
+    """ One repository to document, and the refs to build for it. """
+
+    def __init__(self, name, uri, dest, refs=None, depends=None, priority=0,
+                 **options):
+        self.name = name
+        self.uri = uri
+        self.dest = dest
+        self.refs = refs or [None]
+        self.depends = depends or []
+        self.priority = priority
+        self.cache_dir = None
+        self.history = None
+        self.options = options
+
+    @classmethod
+    def from_config(cls, name, options, dest=None, defaults=None):
+        """ Create a project from a ``[project:<name>]`` config section.
+        Without a ``dest`` of its own, the project is built into
+        ``<dest>/<name>``. `defaults` are options used when the section
+        does not set them. """
+        if 'uri' not in options:
+            raise ValueError("Project %r has no uri" % name)
+        if 'dest' in options:
+            dest = options['dest']
+        elif dest:
+            dest = os.path.join(dest, name)
+        else:
+            raise ValueError("Project %r has no dest" % name)
+        project_options = dict((k, v) for k, v in (defaults or {}).items()
+                               if k in PROJECT_OPTIONS and v is not None)
+        project_options.update((k, v) for k, v in options.items()
+                               if k in PROJECT_OPTIONS)
+        if 'memory_budget' in project_options:
+            # megabytes, as on the command line
+            project_options['memory_budget'] = \
+                int(project_options['memory_budget']) * 1024 * 1024
+        return cls(name, options['uri'], dest,
+                   refs=parse_refs(options.get('refs', '')),
+                   depends=options.get('depends', '').replace(',', ' ').split(),
+                   priority=int(options.get('priority', 0)),
+                   **project_options)
+
+
+class Job(object):
+    """ Build a single ref of a project. """
+
+    def __init__(self, project, ref):
+        self.project = project
+        self.ref = ref
+
+    @property
+    def name(self):
+        if self.ref:
+            return "%s@%s:%s" % ((self.project.name,) + self.ref)
+        return self.project.name
+
+    def kwargs(self, mirror=None):
+        """ Keyword arguments for `Docfu`. """
+        kwargs = dict(self.project.options)
+        kwargs.pop('root_dir', None)
+        if self.project.cache_dir:
+            kwargs['cache_dir'] = self.project.cache_dir
+        if self.project.history:
+            kwargs['history'] = self.project.history
+        if self.ref:
+            kwargs[self.ref[0]] = self.ref[1]
+        if mirror:
+            kwargs['git_mirror'] = mirror
+        return kwargs
+
+    def __repr__(self):
+        return "<Job %s>" % self.name
+
+
+class BuildPlan(object):
+    """ A set of projects built as one dependency-ordered, parallel plan. """
+
+    def __init__(self, projects, workers=1, cache_dir=None, history=None):
+        self.projects = dict((p.name, p) for p in projects)
+        self.order = [p.name for p in projects]
+        self.workers = max(1, workers)
+        self.cache_dir = cache_dir
+        for project in projects:
+            project.cache_dir = cache_dir
+            project.history = history
+        self._mirrors = {}
+        self._mirror_locks = {}
+        self._lock = threading.Lock()
+        self._check()
+
+    @classmethod
+    def from_config(cls, config, cache_dir=None, history=None, **defaults):
+        """ Create a plan from a read `docfu.config.Config`. `cache_dir` and
+        `history` override the ``[docfu]`` settings; `defaults` are project
+        options for sections which do not set them. """
+        dest = config.get('dest')
+        projects = [Project.from_config(name, options, dest, defaults)
+                    for name, options in config.projects()]
+        return cls(projects,
+                   workers=int(config.get('workers', default=1)),
+                   cache_dir=cache_dir or config.get('cache_dir'),
+                   history=history or config.get('history'))
+
+    def _check(self):
+        """ Raise `ValueError` on unknown dependencies, cycles or refs of
+        two projects built into the same directory. """
+        outputs = {}
+        for name in self.order:
+            project = self.projects[name]
+            dest = os.path.abspath(os.path.expanduser(project.dest))
+            for ref in project.refs:
+                # without a ref, Docfu builds into <dest>/file/<uri basename>
+                ref = ref or ('file', os.path.basename(
+                    uri_parse(project.uri).replace('file://', '')))
+                other = outputs.setdefault((dest, ref), name)
+                if other != name:
+                    raise ValueError("Projects %r and %r both build %s into %s"
+                        % (other, name, ':'.join(ref), dest))
+        for project in self.projects.values():
+            for dep in project.depends:
+                if dep not in self.projects:
+                    raise ValueError("Project %r depends on unknown project %r"
+                                     % (project.name, dep))
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError("Dependency cycle: %s"
+                                 % " -> ".join(path + [name]))
+            visiting.add(name)
+            for dep in self.projects[name].depends:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.order:
+            visit(name, [])
+
+    def jobs(self):
+        """ Return every job in the plan, in config order. """
+        return [Job(self.projects[name], ref)
+                for name in self.order for ref in self.projects[name].refs]
+
+    def __call__(self):
+        return self.run()
+
+    def run(self):
+        """ Run every job and return a dict of ``{job name: error}`` for the
+        jobs which failed or were skipped because a dependency failed. """
+        jobs = self.jobs()
+        # Jobs left to finish per project, and projects waiting on each one.
+        remaining = dict((name, 0) for name in self.order)
+        for job in jobs:
+            remaining[job.project.name] += 1
+        waiting = dict((name, set(self.projects[name].depends))
+                       for name in self.order)
+        by_project = dict((name, []) for name in self.order)
+        for index, job in enumerate(jobs):
+            by_project[job.project.name].append((index, job))
+
+        ready = []
+        failed = {}
+        done = Queue.Queue()
+        running = 0
+
+        def release(name):
+            for index, job in by_project[name]:
+                heapq.heappush(ready, (-job.project.priority, index, job))
+
+        def skip(name, reason):
+            for index, job in by_project[name]:
+                failed[job.name] = reason
+            finish(name, ok=False)
+
+        def finish(name, ok=True):
+            for other in self.order:
+                if name in waiting[other]:
+                    waiting[other].discard(name)
+                    if not ok:
+                        skip(other, "dependency %r failed" % name)
+                    elif not waiting[other]:
+                        release(other)
+            waiting[name] = set()
+
+        for name in self.order:
+            if not waiting[name]:
+                release(name)
+
+        logger.info("Building %d refs of %d projects with %d workers"
+                    % (len(jobs), len(self.order), self.workers))
+        while ready or running:
+            while ready and running < self.workers:
+                job = heapq.heappop(ready)[2]
+                if job.name in failed:
+                    continue
+                thread = threading.Thread(target=self._run_job,
+                                          args=(job, done))
+                thread.setDaemon(True)
+                thread.start()
+                running += 1
+            if not running:
+                break
+            job, error = done.get()
+            running -= 1
+            name = job.project.name
+            if error is not None:
+                failed[job.name] = error
+            remaining[name] -= 1
+            if remaining[name] == 0:
+                finish(name, ok=not any(j.name in failed
+                                        for i, j in by_project[name]))
+
+        for name, error in sorted(failed.items()):
+            logger.error("Build failed: %s: %s" % (name, error))
+        logger.info("Built %d of %d refs" % (len(jobs) - len(failed),
+                                             len(jobs)))
+        return failed
+
+    def _mirror(self, uri):
+        """ Return the path of an up-to-date mirror of `uri`, fetching it at
+        most once per plan. """
+        with self._lock:
+            lock = self._mirror_locks.setdefault(uri, threading.Lock())
+        with lock:
+            if uri not in self._mirrors:
+                self._mirrors[uri] = git_mirror(
+                    uri, os.path.join(self.cache_dir, 'git'))
+            return self._mirrors[uri]
+
+    def _run_job(self, job, done):
+        error = None
+        try:
+            logger.info("Starting %s" % job.name)
+            uri = uri_parse(job.project.uri)
+            mirror = None
+            if self.cache_dir and not uri.startswith('file://'):
+                mirror = self._mirror(uri)
+            root = job.project.options.get('root_dir', 'docs/')
+            with Docfu(job.project.uri, root, job.project.dest,
+                       **job.kwargs(mirror)) as df:
+                df()
+            logger.info("Finished %s" % job.name)
+        except Exception, e:
+            logger.exception("Could not build %s" % job.name)
+            error = e
+        done.put((job, error))
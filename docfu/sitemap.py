@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+""" Sitemaps and the cross-version page map.
+
+Each build records the pages it rendered in a manifest at
+``<dest_root>/.docfu/manifest.json``, keyed by ``<ref_type>/<ref_val>``
+(the layout `docfu.util.list_refs` reads). From the manifest docfu writes
+``<dest_root>/versions.json``, mapping every page path to the refs which
+have it, without walking the destination. """
+from __future__ import with_statement
+
+import json
+import logging
+import os
+import os.path
+import threading
+from time import gmtime, strftime
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger('docfu')
+
+_manifest_lock = threading.Lock()
+
+
+def _write_atomic(path, data):
+    """ Write `data` to `path` via a temporary file and a rename. """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.rename(tmp_path, path)
+
+
+def write_sitemap(path, urls, lastmod=None):
+    """ Write a sitemap.xml listing `urls` to `path`. """
+    lastmod = lastmod or strftime('%Y-%m-%d', gmtime())
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for url in urls:
+        lines.append('  <url><loc>%s</loc><lastmod>%s</lastmod></url>'
+                     % (escape(url), lastmod))
+    lines.append('</urlset>\n')
+    _write_atomic(path, '\n'.join(lines).encode('utf-8'))
+    logger.debug("Wrote sitemap of %d pages: %s" % (len(urls), path))
+
+
+def read_manifest(dest_root):
+    """ Return the manifest at `dest_root`, or an empty one. """
+    manifest_path = os.path.join(dest_root, '.docfu', 'manifest.json')
+    if os.path.isfile(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning("Ignoring corrupt manifest: %s" % manifest_path)
+    return {}
+
+
+def update_manifest(dest_root, ref_type, ref_val, pages):
+    """ Record `pages` (output paths relative to the ref) as the pages of
+    `ref_type`/`ref_val`, drop refs whose directory is gone, and rewrite
+    ``versions.json``. Returns the manifest. """
+    state_dir = os.path.join(dest_root, '.docfu')
+    manifest_path = os.path.join(state_dir, 'manifest.json')
+    with _manifest_lock:
+        manifest = read_manifest(dest_root)
+        manifest['%s/%s' % (ref_type, ref_val)] = sorted(pages)
+        for ref in list(manifest):
+            if not os.path.isdir(os.path.join(dest_root, ref)):
+                del manifest[ref]
+
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+        _write_atomic(manifest_path, json.dumps(manifest, sort_keys=True))
+        _write_atomic(os.path.join(dest_root, 'versions.json'),
+                      json.dumps(version_map(manifest), sort_keys=True))
+    return manifest
+
+
+def version_map(manifest):
+    """ Return ``{page path: [{ref_type, ref_val, url}, ...]}`` for every
+    page in `manifest`. """
+    result = {}
+    for ref in sorted(manifest):
+        ref_type, ref_val = ref.split('/', 1)
+        for page in manifest[ref]:
+            result.setdefault(page, []).append({
+                'ref_type': ref_type,
+                'ref_val': ref_val,
+                'url': '/%s/%s' % (ref, page),
+            })
+    return result
@@ -1,8 +1,10 @@
+import errno
 import glob
 import json
 import os
 import os.path
 import random
+import re
 import shlex
 import shutil
 import subprocess
@@ -11,8 +13,6 @@ import tempfile
 import urlparse
 import logging
 
-import git
-
 logger = logging.getLogger('docfu')
 
 
@@ -53,18 +53,48 @@ def parse_package_json(json_path):
 #
 # Git / repository utils
 #
-def git_clone(git_url):
+def git_clone(git_url, mirror=None):
     """ Clone a github url into a temp directory. Set a global object to
-    this class so it can be closed. """
+    this class so it can be closed.
+
+    If `mirror` is the path of a local mirror of `git_url` (see
+    `git_mirror`), clone from it instead of the network. """
     logger.debug("Cloning %s" % git_url)
     path = tmp_mk()
-    git_clone_cmd = shlex.split('git clone --depth=5 %s %s'
-            % (str(git_url), str(path)))
+    if mirror:
+        git_clone_cmd = shlex.split('git clone --shared %s %s'
+                % (str(mirror), str(path)))
+    else:
+        git_clone_cmd = shlex.split('git clone --depth=5 %s %s'
+                % (str(git_url), str(path)))
     logger.debug("%s" % git_clone_cmd)
     retcode = subprocess.check_call(git_clone_cmd)
     return path
 
 
+def git_mirror(git_url, cache_dir):
+    """ Create or update a bare mirror of `git_url` in `cache_dir` and return
+    its path. Clones from the mirror are local and near-instant. """
+    cache_dir = os.path.expanduser(cache_dir)
+    path = os.path.join(cache_dir, re.sub(r'[^\w.-]+', '_', git_url))
+    if os.path.isdir(path):
+        logger.debug("Updating mirror of %s at %s" % (git_url, path))
+        subprocess.check_call(shlex.split('git remote update --prune'),
+            cwd=path)
+    else:
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError, e:
+                # another job mirroring a different uri created it first
+                if e.errno != errno.EEXIST:
+                    raise
+        logger.debug("Mirroring %s to %s" % (git_url, path))
+        subprocess.check_call(shlex.split('git clone --mirror %s %s'
+            % (str(git_url), str(path))))
+    return path
+
+
 def git_checkout(git_repo_path, ref_type, ref_val):
     """ Checkout the code at git_repo_path. Ref is the specific branch or
     tag to use. """
@@ -83,6 +113,8 @@ def git_checkout(git_repo_path, ref_type, ref_val):
 
 
 def get_git_tag(git_repo_path):
+    import git
+
     repo = git.Repo(git_repo_path)
     g = repo.git
     tag = g.describe('--tags', g.rev_list('--tags', max_count=1))
@@ -141,18 +173,35 @@ def tmp_cp(src):
     return dest
 
 
-def walk_files(path):
-    """ Return a set of files found in `path`. """
-    paths = set()
-    logger.debug("Walking: %s" % path)
-    for current, dirnames, files in os.walk(path):
-        dirnames[:] = filter(lambda x: not (x.startswith("_") or x.startswith(".")), dirnames)
+def is_unchanged(dest_path, size, mtime):
+    """ Return True if `dest_path` exists with this `size` and `mtime`
+    (to the second), i.e. a copy made with `shutil.copy2`. """
+    try:
+        st = os.stat(dest_path)
+    except OSError:
+        return False
+    return st.st_size == size and int(st.st_mtime) == int(mtime)
+
+
+def merge_tree(src, dest):
+    """ Copy the files in `src` into `dest`, keeping whatever else is in
+    `dest`. Files whose size and mtime already match are not copied.
+    Returns the number of files copied. """
+    copied = 0
+    for current, dirnames, files in os.walk(src):
+        dest_dir = os.path.join(dest, os.path.relpath(current, src))
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
         for f in files:
-            if not (f.startswith("_") or f.startswith(".")):
-                paths.add(os.path.join(current, f))
-                logger.debug("Source file found: %s" %
-                    os.path.join(current, f))
-    return paths
+            src_path = os.path.join(current, f)
+            dest_path = os.path.join(dest_dir, f)
+            src_st = os.stat(src_path)
+            if is_unchanged(dest_path, src_st.st_size, src_st.st_mtime):
+                continue
+            shutil.copy2(src_path, dest_path)
+            copied += 1
+    logger.debug("Merged %d files from %s into %s" % (copied, src, dest))
+    return copied
 
 
 def list_refs(path):
@@ -177,6 +226,8 @@ def list_refs(path):
         logger.debug("Listing refs for root path: %s" % path)
 
         for x in glob.glob(os.path.join(path, '*')):
+            if not os.path.isdir(x):
+                continue
             ref_type = os.path.basename(x)
             result[ref_type] = {}
             result[ref_type]['path'] = x
@@ -1,4 +1,15 @@
 import test.util
+import test.log
+import test.plan
+import test.pages
+import test.sitemap
+import test.cache
+import test.highlight
+import test.cli
+import test.files
+import test.memory
+import test.render
+import test.metrics
 
 def main():
     util.main()
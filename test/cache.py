@@ -0,0 +1,46 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+import time
+
+from docfu.cache import RenderCache
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = RenderCache(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_put(self):
+        key = RenderCache.key('source', u'globals \xe9')
+        self.assertEqual(self.cache.get(key), None)
+        self.cache.put(key, u'<p>\xe9</p>')
+        self.assertEqual(self.cache.get(key), u'<p>\xe9</p>')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key(self):
+        self.assertNotEqual(RenderCache.key('ab', 'c'),
+                            RenderCache.key('a', 'bc'))
+
+    def test_prune_lru(self):
+        keys = [RenderCache.key(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, 'x' * 10)
+            path = os.path.join(self.dir, key[:2], key[2:])
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        self.cache.get(keys[0])
+        self.assertEqual(self.cache.prune(20), 1)
+        self.assertEqual(self.cache.get(keys[1]), None)
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
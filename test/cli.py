@@ -0,0 +1,68 @@
+import unittest
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('jinja2', 'markdown', 'git', 'pygments', 'smtplib',
+                 'sqlite3')
+
+
+def _python(code):
+    """ Run `code` in a fresh interpreter and return its stdout. """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    p = subprocess.Popen([sys.executable, '-c', code], env=env,
+        stdout=subprocess.PIPE)
+    return p.communicate()[0].strip()
+
+
+class CliTest(unittest.TestCase):
+
+    def test_import_is_lightweight(self):
+        loaded = _python('import sys, docfu.cli; '
+            'print(" ".join(m for m in %r if m in sys.modules))'
+            % (HEAVY_MODULES,))
+        self.assertEqual(loaded, '')
+
+    def test_version(self):
+        from docfu import __version__
+        out = _python('import docfu.cli; docfu.cli.main(["-V"])')
+        self.assertEqual(out, 'v' + __version__)
+
+    def test_import_time(self):
+        # Generous bound; importing the heavy modules takes several times
+        # this long.
+        elapsed = float(_python('import time; t = time.time(); '
+            'import docfu.cli; print(time.time() - t)'))
+        self.assertTrue(elapsed < 0.1, elapsed)
+
+    def test_config_without_projects(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            repo = os.path.join(tmp, 'repo')
+            os.makedirs(os.path.join(repo, 'docs', '_templates'))
+            with open(os.path.join(repo, 'docs', 'index.jmd'), 'w') as f:
+                f.write('hello')
+            with open(os.path.join(repo, 'package.json'), 'w') as f:
+                f.write('{}')
+            config = os.path.join(tmp, 'docs.cfg')
+            with open(config, 'w') as f:
+                f.write('[docfu]\nworkers = 2\n')
+            run = 'import docfu.cli; print(docfu.cli.main(%r))'
+            self.assertEqual(_python(run % (['-q', '--dev', '-c', config],)),
+                             '2')
+            self.assertEqual(_python(run % (['-q', '--dev', '-c', config,
+                repo, os.path.join(tmp, 'out')],)), '0')
+            self.assertTrue(os.path.isfile(os.path.join(tmp, 'out', 'file',
+                'repo', 'index.html')))
+        finally:
+            shutil.rmtree(tmp)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from docfu import files
+
+
+class FilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in ['index.jmd', 'guide/a.jmd', 'guide/notes.txt',
+                     '_hidden/b.jmd', '.git/HEAD', 'drafts/c.jmd',
+                     '_static/css/site.css', '_static/big.psd',
+                     '_templates/base.html']:
+            self._write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text=''):
+        path = os.path.join(self.dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _scan(self):
+        index = files.scan_files(self.dir,
+            os.path.join(self.dir, '_static'),
+            os.path.join(self.dir, '_templates'))
+        return dict((kind, [f.relpath for f in index.of_kind(kind)])
+                    for kind in (files.PAGE, files.TEMPLATE, files.ASSET))
+
+    def test_scan_files(self):
+        self.assertEqual(self._scan(), {
+            'page': ['drafts/c.jmd', 'guide/a.jmd', 'index.jmd'],
+            'template': ['base.html'],
+            'asset': ['big.psd', 'css/site.css'],
+        })
+
+    def test_docfuignore(self):
+        self._write(files.IGNORE_FILE, '# comment\ndrafts/\n*.psd\n')
+        found = self._scan()
+        self.assertEqual(found['page'], ['guide/a.jmd', 'index.jmd'])
+        self.assertEqual(found['asset'], ['css/site.css'])
+
+    def test_is_ignored(self):
+        self.assertTrue(files.is_ignored('a/b.swp', ['*.swp']))
+        self.assertTrue(files.is_ignored('a/b', ['a/*']))
+        self.assertFalse(files.is_ignored('drafts', ['drafts/']))
+        self.assertTrue(files.is_ignored('drafts', ['drafts/'], is_dir=True))
+
+    def test_is_selected(self):
+        self.assertTrue(files.is_selected('guides/a.jmd', ['guides/**']))
+        self.assertTrue(files.is_selected('guides/a.jmd', ['guides/']))
+        self.assertTrue(files.is_selected('guides/a.jmd', ['guides/a.html']))
+        self.assertTrue(files.is_selected('a.jmd', ['*.jmd']))
+        self.assertFalse(files.is_selected('index.jmd', ['guides/**']))
+        self.assertFalse(files.is_selected('guidesx/a.jmd', ['guides']))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
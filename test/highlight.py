@@ -0,0 +1,74 @@
+import unittest
+
+from docfu import highlight
+from docfu.highlight import Highlighter
+
+OPTIONS = (None, 'codehilite', 'default', False, ())
+
+
+class HighlightTest(unittest.TestCase):
+
+    def test_highlight_is_memoized(self):
+        h = Highlighter()
+        html = h.highlight('def f(): pass', 'python', True, OPTIONS)
+        self.assertTrue('<span class="k">def</span>' in html)
+        self.assertEqual(h.highlight('def f(): pass', 'python', True, OPTIONS),
+                         html)
+        self.assertEqual(h.timings['python'][0], 1)
+        self.assertEqual(h.timings['python'][2], 1)
+
+    def test_lexer_and_formatter_are_cached(self):
+        h = Highlighter()
+        self.assertTrue(h.lexer('python') is h.lexer('python'))
+        self.assertEqual(h.lexer('no-such-language'), None)
+        self.assertTrue(h.formatter(OPTIONS) is h.formatter(OPTIONS))
+
+    def test_max_entries(self):
+        h = Highlighter(max_entries=2)
+        for code in ['a = 1', 'b = 2', 'c = 3']:
+            h.highlight(code, 'python', True, OPTIONS)
+        self.assertEqual(len(h._output), 2)
+
+    def test_report(self):
+        h = Highlighter()
+        h.highlight('a = 1', 'python', True, OPTIONS)
+        snapshot = h.snapshot()
+        h.highlight('a = 1', 'python', True, OPTIONS)
+        self.assertEqual([(lang, blocks, hits)
+                          for lang, blocks, seconds, hits in h.report(snapshot)],
+                         [('python', 0, 1)])
+
+    def test_merge(self):
+        h = Highlighter()
+        h.highlight('a = 1', 'python', True, OPTIONS)
+        h.merge([('python', 2, 0.5, 3), ('ruby', 1, 0.25, 0)])
+        self.assertEqual(h.timings['python'][0], 3)
+        self.assertEqual(h.timings['python'][2], 3)
+        self.assertEqual(h.timings['ruby'], [1, 0.25, 0])
+
+    def test_resize(self):
+        h = Highlighter()
+        for code in ['a = 1', 'b = 2', 'c = 3']:
+            h.highlight(code, 'python', True, OPTIONS)
+        h.resize(1)
+        self.assertEqual(len(h._output), 1)
+
+    def test_using(self):
+        h = Highlighter()
+        self.assertTrue(highlight.current() is highlight.highlighter)
+        with highlight.using(h):
+            self.assertTrue(highlight.current() is h)
+        self.assertTrue(highlight.current() is highlight.highlighter)
+
+    def test_prewarm_in_batches(self):
+        h = Highlighter()
+        texts = iter(['```python\na = 1\n```\n\n```python\nb = 2\n```\n',
+                      '```python\na = 1\n```\n'])
+        self.assertEqual(h.prewarm(texts, processes=2, batch_size=1), 3)
+        self.assertEqual(len(h._output), 2)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import unittest
+
+import json
+import logging
+
+from docfu import log
+
+
+class LogTest(unittest.TestCase):
+
+    def _record(self, msg, level=logging.ERROR):
+        return logging.LogRecord('docfu', level, __file__, 1, msg, None,
+            None)
+
+    def test_json_formatter(self):
+        record = self._record('hello')
+        record.data = {'page': 'index.jmd'}
+        data = json.loads(log.JSONFormatter().format(record))
+        self.assertEqual(data['message'], 'hello')
+        self.assertEqual(data['level'], 'ERROR')
+        self.assertEqual(data['page'], 'index.jmd')
+
+    def test_queue_listener_drains_on_close(self):
+        records = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+
+        handler = log.async_handler(ListHandler())
+        for i in range(10):
+            handler.handle(self._record('msg %d' % i))
+        handler.close()
+        self.assertEqual(records, ['msg %d' % i for i in range(10)])
+
+    def test_traceback_logged_once_per_sink(self):
+        sinks = [[], []]
+
+        class ListHandler(logging.Handler):
+            def __init__(self, sink):
+                logging.Handler.__init__(self)
+                self.sink = sink
+
+            def emit(self, record):
+                self.sink.append(self.format(record))
+
+        parent = logging.getLogger('docfu-test')
+        child = logging.getLogger('docfu-test.child')
+        parent_handler = log.async_handler(ListHandler(sinks[0]))
+        child_handler = log.async_handler(ListHandler(sinks[1]))
+        parent.addHandler(parent_handler)
+        child.addHandler(child_handler)
+        try:
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                child.exception('failed')
+        finally:
+            child.removeHandler(child_handler)
+            parent.removeHandler(parent_handler)
+            child_handler.close()
+            parent_handler.close()
+        for sink in sinks:
+            self.assertEqual(len(sink), 1)
+            self.assertEqual(sink[0].count('Traceback'), 1, sink[0])
+
+    def test_queued_json_traceback(self):
+        lines = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                lines.append(self.format(record))
+
+        sink = ListHandler()
+        sink.setFormatter(log.JSONFormatter())
+        handler = log.async_handler(sink)
+        logger = logging.getLogger('docfu-test.json')
+        logger.addHandler(handler)
+        try:
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logger.exception('failed %s', 'page')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        data = json.loads(lines[0])
+        self.assertEqual(data['message'], 'failed page')
+        self.assertTrue('ValueError: boom' in data['exc'], data)
+
+    def test_digest_caps_records(self):
+        handler = log.DigestSMTPHandler('localhost', 'a@b', ['c@d'], 's',
+            capacity=2)
+        for i in range(5):
+            handler.handle(self._record('error %d' % i))
+        self.assertEqual(len(handler.buffer), 2)
+        self.assertEqual(handler.dropped, 3)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import unittest
+
+from docfu import memory
+
+
+class MemoryTest(unittest.TestCase):
+
+    def test_limits_grow_with_budget(self):
+        small = memory.limits(16 * 1024 * 1024)
+        large = memory.limits(1024 * 1024 * 1024)
+        for name in small:
+            self.assertTrue(0 < small[name] <= large[name], name)
+
+    def test_limits_have_a_floor(self):
+        self.assertEqual(memory.limits(0),
+            {'template_cache': 10, 'highlight_entries': 64, 'in_flight': 16})
+
+    def test_peak_rss(self):
+        peak = memory.peak_rss()
+        if peak is not None:
+            self.assertTrue(peak > 1024 * 1024)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from docfu import metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.history = os.path.join(self.tmp, 'history.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _build(self, rendered, reused=0, failed=0):
+        build = metrics.BuildMetrics()
+        with build.phase('render'):
+            build.count('pages_rendered', rendered)
+        build.count('pages_reused', reused)
+        build.count('pages_failed', failed)
+        build.count('bytes_written', 1024)
+        build.finish()
+        return build
+
+    def test_phase(self):
+        build = metrics.BuildMetrics()
+        with build.phase('scan'):
+            pass
+        with build.phase('scan'):
+            pass
+        self.assertEqual(list(build.phases), ['scan'])
+        self.assertTrue(build.phases['scan'] >= 0)
+
+    def test_prometheus_text(self):
+        metrics.record(self.history, self._build(3), 'repo', 'branch', 'master')
+        metrics.record(self.history, self._build(1, reused=2, failed=1),
+            'repo', 'branch', 'master', status='failed')
+        metrics.record(self.history, self._build(5), 'repo', 'tag', '0.1')
+        text = metrics.prometheus_text(self.history)
+        master = 'ref="branch/master",uri="repo"'
+        self.assertTrue('docfu_builds_total{ref="branch/master",status="ok",uri="repo"} 1'
+                        in text, text)
+        self.assertTrue('docfu_builds_total{ref="branch/master",status="failed",'
+                        'uri="repo"} 1'
+                        in text, text)
+        # only the latest build of each ref
+        self.assertTrue('docfu_last_build_pages_rendered{%s} 1' % master
+                        in text, text)
+        self.assertTrue('docfu_last_build_pages_reused{%s} 2' % master
+                        in text, text)
+        self.assertTrue('docfu_last_build_pages_rendered'
+                        '{ref="tag/0.1",uri="repo"} 5' in text, text)
+        self.assertTrue('docfu_last_build_phase_seconds'
+                        '{phase="render",%s} ' % master in text, text)
+
+    def test_empty_history(self):
+        text = metrics.prometheus_text(self.history)
+        self.assertTrue('# TYPE docfu_builds_total counter' in text)
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from docfu import pages
+from docfu.files import scan_files
+
+
+class PagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_split_front_matter(self):
+        text = '---\ntitle: Hello\norder: 3\ntags: a, b\n---\nbody\n'
+        meta, body = pages.split_front_matter(text)
+        self.assertEqual(meta, {'title': 'Hello', 'order': 3,
+                                'tags': ['a', 'b']})
+        # line numbers are preserved
+        self.assertEqual(body.split('\n').index('body'),
+                         text.split('\n').index('body'))
+
+    def test_split_front_matter_without_block(self):
+        for text in ['body', '---\ntitle: unterminated']:
+            self.assertEqual(pages.split_front_matter(text), ({}, text))
+
+    def test_build_page_index(self):
+        self._write('b.jmd', '---\ntitle: B\ntags: x\n---\n')
+        self._write('a.jmd', '---\norder: 1\n---\n')
+        self._write('style.css', '')
+        cache_path = os.path.join(self.dir, '_cache', 'pages.json')
+        for i in range(2):
+            files = scan_files(self.dir).of_kind('page')
+            index = pages.build_page_index(self.dir, files, '/branch/master',
+                                           cache_path)
+            self.assertEqual([p.path for p in index], ['b.html', 'a.html'])
+            self.assertEqual(index.get('/b.html').title, 'B')
+            self.assertEqual(index.get('a.html').url, '/branch/master/a.html')
+            self.assertEqual(index.tagged('x'), [index.get('b.html')])
+        self.assertTrue(os.path.isfile(cache_path))
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import unittest
+
+import threading
+import time
+
+from docfu import plan
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_parse_refs(self):
+        self.assertEqual(plan.parse_refs('branch:master tag:0.1, develop'),
+            [('branch', 'master'), ('tag', '0.1'), ('branch', 'develop')])
+        self.assertRaises(ValueError, plan.parse_refs, 'commit:abc')
+
+    def test_dependency_cycle(self):
+        projects = [plan.Project('a', 'a', '/tmp', depends=['b']),
+                    plan.Project('b', 'b', '/tmp', depends=['a'])]
+        self.assertRaises(ValueError, plan.BuildPlan, projects)
+
+    def test_unknown_dependency(self):
+        projects = [plan.Project('a', 'a', '/tmp', depends=['theme'])]
+        self.assertRaises(ValueError, plan.BuildPlan, projects)
+
+    def test_jobs(self):
+        projects = [plan.Project('a', 'a', '/tmp',
+                                 refs=[('branch', 'master'), ('tag', '0.1')])]
+        jobs = plan.BuildPlan(projects).jobs()
+        self.assertEqual([j.name for j in jobs],
+                         ['a@branch:master', 'a@tag:0.1'])
+        self.assertEqual(jobs[1].kwargs('/cache/a'),
+                         {'tag': '0.1', 'git_mirror': '/cache/a'})
+
+    def test_default_dest_per_project(self):
+        a = plan.Project.from_config('a', {'uri': 'a/a'}, '/docs')
+        b = plan.Project.from_config('b', {'uri': 'b/b', 'dest': '/b'},
+            '/docs')
+        self.assertEqual(a.dest, '/docs/a')
+        self.assertEqual(b.dest, '/b')
+
+    def test_defaults(self):
+        a = plan.Project.from_config('a', {'uri': 'a/a', 'log_format': 'text'},
+            '/docs', {'log_format': 'json', 'site_url': None})
+        self.assertEqual(a.options, {'log_format': 'text'})
+
+    def test_same_output(self):
+        projects = [plan.Project('a', 'a/a', '/docs'),
+                    plan.Project('b', 'b/a', '/docs')]
+        self.assertRaises(ValueError, plan.BuildPlan, projects)
+        projects = [plan.Project('a', 'a/a', '/docs',
+                                 refs=[('branch', 'master')]),
+                    plan.Project('b', 'b/b', '/docs/',
+                                 refs=[('branch', 'master')])]
+        self.assertRaises(ValueError, plan.BuildPlan, projects)
+        projects[1].dest = '/docs/b'
+        plan.BuildPlan(projects)
+
+    def _run(self, projects, workers=1, fail=(), delay=0):
+        """ Run a plan with `_run_job` stubbed out; return the job names in
+        start order, the failures and the most jobs running at once. """
+        started = []
+        running = [0, 0]
+        lock = threading.Lock()
+        build_plan = plan.BuildPlan(projects, workers=workers)
+
+        def run_job(job, done):
+            with lock:
+                started.append(job.name)
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(delay)
+            with lock:
+                running[0] -= 1
+            done.put((job, ValueError('boom') if job.name in fail else None))
+
+        build_plan._run_job = run_job
+        failed = build_plan.run()
+        return started, failed, running[1]
+
+    def test_run_order(self):
+        projects = [plan.Project('a', 'a', '/tmp'),
+                    plan.Project('b', 'b', '/tmp', priority=5),
+                    plan.Project('c', 'c', '/tmp', depends=['a'],
+                                 priority=20),
+                    plan.Project('d', 'd', '/tmp', depends=['c'])]
+        started, failed, most = self._run(projects)
+        self.assertEqual(started, ['b', 'a', 'c', 'd'])
+        self.assertEqual(failed, {})
+
+    def test_run_workers(self):
+        projects = [plan.Project(name, name, '/tmp') for name in 'abcde']
+        started, failed, most = self._run(projects, workers=2, delay=0.05)
+        self.assertEqual(sorted(started), list('abcde'))
+        self.assertEqual(most, 2)
+
+    def test_run_skips_dependents(self):
+        projects = [plan.Project('a', 'a', '/tmp'),
+                    plan.Project('b', 'b', '/tmp', depends=['a']),
+                    plan.Project('c', 'c', '/tmp', depends=['b']),
+                    plan.Project('d', 'd', '/tmp')]
+        started, failed, most = self._run(projects, fail=['a'])
+        self.assertEqual(started, ['a', 'd'])
+        self.assertEqual(sorted(failed), ['a', 'b', 'c'])
+        self.assertTrue(isinstance(failed['a'], ValueError))
+        self.assertEqual(failed['c'], "dependency 'b' failed")
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import unittest
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from docfu import Docfu, PageWorker
+from docfu.highlight import highlighter
+
+
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.dir, 'repo')
+        self.dest = os.path.join(self.dir, 'out')
+        self._write('package.json', '{"name": "test"}')
+        self._write('docs/_templates/base.html', '{% block body %}{% endblock %}')
+        self._write('docs/good.jmd', 'good')
+        self._write('docs/syntax.jmd', 'line 1\n{% if %}\n')
+        self._write('docs/runtime.jmd', 'a\nb\n{{ 1 / 0 }}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text):
+        path = os.path.join(self.repo, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _build(self, **kwargs):
+        with Docfu(self.repo, 'docs/', self.dest, **kwargs) as df:
+            df()
+        return df
+
+    def _output(self, name):
+        return os.path.join(self.dest, 'file', 'repo', name)
+
+    def test_failures_are_isolated(self):
+        df = self._build()
+        self.assertTrue(os.path.isfile(self._output('good.html')))
+        failures = dict((f['page'], f) for f in df.failures)
+        self.assertEqual(sorted(failures), ['runtime.jmd', 'syntax.jmd'])
+        self.assertEqual(failures['syntax.jmd']['lineno'], 2)
+        self.assertEqual(failures['runtime.jmd']['lineno'], 3)
+        self.assertEqual(failures['runtime.jmd']['error'],
+                         'ZeroDivisionError')
+
+    def test_keep_previous_output(self):
+        os.makedirs(os.path.dirname(self._output('runtime.html')))
+        with open(self._output('runtime.html'), 'w') as f:
+            f.write('previous')
+        self._build(on_error='keep')
+        self.assertEqual(open(self._output('runtime.html')).read(), 'previous')
+        self.assertFalse(os.path.exists(self._output('syntax.html')))
+
+    def test_page_timeout(self):
+        self._write('docs/loop.jmd',
+            '{% for i in range(1000000000) %}{% endfor %}')
+        df = self._build(page_timeout=0.5)
+        failures = dict((f['page'], f) for f in df.failures)
+        self.assertEqual(failures['loop.jmd']['error'], 'Timeout')
+        self.assertEqual(failures['runtime.jmd']['lineno'], 3)
+        self.assertTrue(os.path.isfile(self._output('good.html')))
+
+    def test_current_page(self):
+        self._write('docs/_templates/titled.html',
+            '<title>{{ PAGE.title }}</title>{% block body %}{% endblock %}')
+        self._write('docs/titled.jmd', '---\ntitle: Hello\n---\n'
+            '{% extends "titled.html" %}{% block body %}{{ PAGE.path }}'
+            '{% endblock %}')
+        self._build()
+        self.assertEqual(open(self._output('titled.html')).read().strip(),
+                         '<title>Hello</title>titled.html')
+
+    def test_sitemap_needs_site_url(self):
+        self._build()
+        self.assertFalse(os.path.exists(self._output('sitemap.xml')))
+        self._build(site_url='http://example.com/docs/')
+        sitemap = open(self._output('sitemap.xml')).read()
+        self.assertTrue('<loc>http://example.com/docs/file/repo/good.html</loc>'
+                        in sitemap, sitemap)
+
+    def test_render_cache(self):
+        os.remove(os.path.join(self.repo, 'docs', 'syntax.jmd'))
+        os.remove(os.path.join(self.repo, 'docs', 'runtime.jmd'))
+        self._write('docs/_templates/base.html',
+            '{{ PKG.name }}{% block body %}{% endblock %}')
+        self._write('docs/a.jmd',
+            '{% extends "base.html" %}{% block body %}a{% endblock %}')
+        self._write('docs/refs.jmd',
+            '{% for ref_type in ALL_GIT_REFS %}{{ ref_type }}{% endfor %}')
+        cache_dir = os.path.join(self.dir, 'cache')
+
+        def build():
+            counters = self._build(cache_dir=cache_dir).metrics.counters
+            return counters['pages_rendered'], counters['pages_reused']
+
+        self.assertEqual(build(), (3, 0))
+        self.assertEqual(build(), (0, 3))
+        self._write('docs/_templates/base.html',
+            '<b>{{ PKG.name }}</b>{% block body %}{% endblock %}')
+        self.assertEqual(build(), (1, 2))
+        self._write('package.json', '{"name": "renamed"}')
+        self.assertEqual(build(), (1, 2))
+        self.assertEqual(open(self._output('a.html')).read(), '<b>renamed</b>a')
+        # keys do not depend on where the output goes
+        self.dest = os.path.join(self.dir, 'elsewhere')
+        self.assertEqual(build(), (0, 3))
+
+    def test_page_worker_is_reused(self):
+        starts = []
+        start = PageWorker.start
+        PageWorker.start = lambda worker: (starts.append(1), start(worker))
+        try:
+            self._build(page_timeout=5)
+            self.assertEqual(len(starts), 1)
+            self._write('docs/loop.jmd',
+                '{% for i in range(1000000000) %}{% endfor %}')
+            self._build(page_timeout=0.5)
+        finally:
+            PageWorker.start = start
+        # started again for the page after the one which timed out
+        self.assertEqual(len(starts), 3)
+
+    def test_highlight_report_with_page_timeout(self):
+        self._write('docs/code.jmd', '{% markdown %}\n```python\n'
+            'timed_out = "' + self.dir + '"\n```\n{% endmarkdown %}')
+        before = highlighter.snapshot()
+        self._build(page_timeout=5)
+        self.assertEqual([(lang, blocks) for lang, blocks, seconds, hits
+                          in highlighter.report(before)], [('python', 1)])
+
+    def test_prewarm_skips_cached_pages(self):
+        self._write('docs/code.jmd', '{% markdown %}\n```python\n'
+            'prewarmed = "' + self.dir + '"\n```\n{% endmarkdown %}')
+        cache_dir = os.path.join(self.dir, 'cache')
+        self._build(cache_dir=cache_dir)
+        calls = []
+        prewarm = highlighter.prewarm
+        highlighter.prewarm = lambda texts, *args, **kwargs: \
+            calls.extend(texts)
+        try:
+            self._build(cache_dir=cache_dir, highlight_workers=1)
+        finally:
+            highlighter.prewarm = prewarm
+        # only the failing pages are not cached
+        self.assertEqual(calls, ['a\nb\n{{ 1 / 0 }}\n', 'line 1\n{% if %}\n'])
+
+    def test_only(self):
+        self._write('docs/_static/site.css', 'body {}')
+        self._write('docs/guides/a.jmd', 'a')
+        self._build()
+        self._write('docs/good.jmd', 'better')
+        self._write('docs/guides/a.jmd', 'changed')
+        df = self._build(only=['guides/'])
+        self.assertEqual(open(self._output('guides/a.html')).read(), 'changed')
+        self.assertEqual(open(self._output('good.html')).read(), 'good')
+        self.assertEqual(open(self._output('_static/site.css')).read(),
+                         'body {}')
+        # the unchanged asset was not copied again
+        self.assertEqual(df.metrics.counters['bytes_written'], len('changed'))
+
+        self._write('docs/_static/site.css', 'body { margin: 0 }')
+        os.utime(os.path.join(self.repo, 'docs/_static/site.css'),
+                 (time.time() + 10,) * 2)
+        self._build(only=['guides/'])
+        self.assertEqual(open(self._output('_static/site.css')).read(),
+                         'body { margin: 0 }')
+
+    def test_only_without_matches(self):
+        messages = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        handler = ListHandler(logging.WARNING)
+        logging.getLogger('docfu').addHandler(handler)
+        try:
+            self._build(only=['docs/good.jmd'])
+        finally:
+            logging.getLogger('docfu').removeHandler(handler)
+        self.assertTrue(any('matched no pages' in m for m in messages),
+                        messages)
+
+    def test_memory_budget_is_per_build(self):
+        max_entries = highlighter.max_entries
+        self._write('docs/code.jmd', '{% markdown %}\n```python\n'
+            'budget = "' + self.dir + '"\n```\n{% endmarkdown %}')
+        df = self._build(memory_budget=1024 * 1024, page_timeout=5)
+        self.assertEqual(highlighter.max_entries, max_entries)
+        self.assertEqual(df.highlighter.max_entries,
+                         df.limits['highlight_entries'])
+        self.assertTrue(df.highlighter is not highlighter)
+        self.assertEqual([(lang, blocks) for lang, blocks, seconds, hits
+                          in df.highlighter.report()], [('python', 1)])
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
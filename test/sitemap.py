@@ -0,0 +1,44 @@
+import unittest
+
+import json
+import os
+import shutil
+import tempfile
+
+from docfu import sitemap
+
+
+class SitemapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_sitemap(self):
+        path = os.path.join(self.dir, 'sitemap.xml')
+        sitemap.write_sitemap(path, ['http://x/a.html?b&c'], '2013-01-01')
+        data = open(path).read()
+        self.assertTrue('<loc>http://x/a.html?b&amp;c</loc>' in data)
+        self.assertTrue('<lastmod>2013-01-01</lastmod>' in data)
+
+    def test_update_manifest(self):
+        for ref in ['branch/master', 'tag/0.1', 'tag/0.2']:
+            os.makedirs(os.path.join(self.dir, ref))
+        sitemap.update_manifest(self.dir, 'branch', 'master', ['a.html'])
+        sitemap.update_manifest(self.dir, 'tag', '0.1', ['a.html', 'b.html'])
+        sitemap.update_manifest(self.dir, 'tag', '0.2', ['b.html'])
+        os.rmdir(os.path.join(self.dir, 'tag', '0.2'))
+        manifest = sitemap.update_manifest(self.dir, 'tag', '0.1', ['a.html'])
+        self.assertEqual(sorted(manifest), ['branch/master', 'tag/0.1'])
+        versions = json.load(open(os.path.join(self.dir, 'versions.json')))
+        self.assertEqual(versions.keys(), ['a.html'])
+        self.assertEqual([v['url'] for v in versions['a.html']],
+                         ['/branch/master/a.html', '/tag/0.1/a.html'])
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 import unittest
 
 import json
+import os
+import shutil
+import tempfile
 
 from docfu import util
 
@@ -21,6 +24,21 @@ class UtilTest(unittest.TestCase):
         pkg_obj = util.parse_package_json(path)
         self.assertEqual(pkg_obj_control, pkg_file)
 
+    def test_merge_tree(self):
+        src, dest = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(src, 'a'))
+            open(os.path.join(src, 'a', 'new.html'), 'w').write('new')
+            open(os.path.join(dest, 'old.html'), 'w').write('old')
+            self.assertEqual(util.merge_tree(src, dest), 1)
+            self.assertEqual(util.merge_tree(src, dest), 0)
+            self.assertEqual(sorted(os.listdir(dest)), ['a', 'old.html'])
+            self.assertEqual(open(os.path.join(dest, 'a', 'new.html')).read(),
+                             'new')
+        finally:
+            shutil.rmtree(src)
+            shutil.rmtree(dest)
+
 def main():
     unittest.main()
 